@@ -0,0 +1,470 @@
+"""
+End-to-end load harness: gateway + N workers against stub GitHub and LLM servers.
+
+Runs fully offline: the gateway is served by uvicorn, and two local stubs
+stand in for the GitHub REST API (PR files, compare, comments) and an
+OpenAI-compatible chat completions endpoint. Signed pull_request webhooks
+are sent at a fixed rate (open loop); a job is complete when its review
+comment reaches the GitHub stub.
+
+    uv run python scripts/load_harness.py --requests 500 --rate 20 --workers 4 --redis-url redis://localhost:6379
+
+With --redis-url (required for the Lua-based fair queue and LLM rate
+limiter) each worker is a separate process started through the worker's
+own entry point, and the gateway runs its lifespan (admission control,
+broadcaster): this measures multi-worker scaling and the real gateway
+path. Without it, fakeredis is used: the workers are pipelines sharing the
+harness's event loop and the gateway lifespan is skipped, so treat the
+numbers as a smoke test only. Reports
+throughput, end-to-end p50/p95/p99 and the per-stage breakdown from the
+worker metrics. With --max-p95 / --min-throughput it exits non-zero when
+a budget is missed, so it can gate a deploy.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SECRET = "load-harness-secret"
+REVIEW_TEXT = (
+    "- **Line 3**: `total` can be None when the list is empty; guard before adding.\n"
+    "- **Line 7**: consider a context manager so the file handle is closed on error.\n"
+    "- **Line 12**: this loop is O(n^2); a set lookup would keep it linear."
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def jittered(seconds: float, jitter: float) -> float:
+    return max(0.0, seconds * random.uniform(1 - jitter, 1 + jitter))
+
+
+class Tracker:
+    """Send and completion times per PR, filled in by the driver and the GitHub stub."""
+
+    def __init__(self):
+        self.sent: Dict[str, float] = {}
+        self.done: Dict[str, float] = {}
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.all_done = asyncio.Event()
+        self.expected = 0
+
+    def complete(self, key: str):
+        if key in self.sent and key not in self.done:
+            self.done[key] = time.perf_counter()
+            if len(self.done) >= self.expected:
+                self.all_done.set()
+
+
+def build_fake_github(args, tracker: Tracker) -> FastAPI:
+    app = FastAPI()
+
+    def make_file(repo: str, pr: int, index: int) -> dict:
+        salt = uuid.uuid4().hex[:8]  # Unique per fetch so the review cache never short-circuits the LLM
+        lines = [f"@@ -1,{args.lines_per_file} +1,{args.lines_per_file + 1} @@"]
+        for n in range(args.lines_per_file):
+            lines.append(f"+    value_{n} = compute_{index}(item, {n})  # {repo}#{pr} {salt}")
+        return {
+            "filename": f"src/module_{index}.py",
+            "status": "modified",
+            "additions": args.lines_per_file,
+            "deletions": 0,
+            "patch": "\n".join(lines),
+        }
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/files")
+    async def pr_files(owner: str, repo: str, number: int, request: Request, per_page: int = 30, page: int = 1):
+        await asyncio.sleep(jittered(args.github_latency, args.jitter))
+        start = (page - 1) * per_page
+        count = max(0, min(per_page, args.files_per_pr - start))
+        files = [make_file(f"{owner}/{repo}", number, start + i) for i in range(count)]
+
+        headers = {}
+        if start + count < args.files_per_pr:
+            url = str(request.url.include_query_params(page=page + 1, per_page=per_page))
+            headers["Link"] = f'<{url}>; rel="next"'
+        return JSONResponse(files, headers=headers)
+
+    @app.get("/repos/{owner}/{repo}/compare/{spec}")
+    async def compare(owner: str, repo: str, spec: str):
+        # Unknown history: the worker falls back to the full PR diff
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.post("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def post_comment(owner: str, repo: str, number: int):
+        await asyncio.sleep(jittered(args.github_latency, args.jitter))
+        tracker.complete(f"{owner}/{repo}#{number}")
+        return JSONResponse({"id": random.randint(1, 10**9)}, status_code=201)
+
+    return app
+
+
+def build_fake_llm(args) -> FastAPI:
+    app = FastAPI()
+
+    def usage(body: dict) -> dict:
+        prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 3 + 1
+        completion = len(REVIEW_TEXT) // 3 + 1
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        latency = jittered(args.llm_latency, args.jitter)
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REVIEW_TEXT},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage(body),
+            }
+
+        async def events():
+            pieces = re.findall(r"\S+\s*", REVIEW_TEXT)
+            for i, piece in enumerate(pieces):
+                await asyncio.sleep(latency / len(pieces))
+                yield _sse(model, {"role": "assistant", "content": piece} if i == 0 else {"content": piece})
+            yield _sse(model, {}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield _sse(model, None, usage=usage(body))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def _sse(model: str, delta: Optional[dict], finish_reason: Optional[str] = None, usage: Optional[dict] = None) -> str:
+    chunk = {
+        "id": "chatcmpl-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def serve(app, port: int, lifespan: str = "off") -> Tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan=lifespan, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()  # Surface bind errors
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+def build_event(repo: str, pr_number: int) -> Tuple[bytes, dict]:
+    payload = {
+        "action": "opened",
+        "number": pr_number,
+        "repository": {"full_name": repo, "name": repo.split("/")[1]},
+        "installation": {"id": 1},
+        "pull_request": {"title": "Load test PR", "head": {"sha": uuid.uuid4().hex}},
+    }
+    body = json.dumps(payload).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "pull_request",
+        "X-GitHub-Delivery": uuid.uuid4().hex,
+        "X-Hub-Signature-256": "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest(),
+    }
+    return body, headers
+
+
+async def drive(url: str, args, tracker: Tracker) -> List[float]:
+    """Sends signed webhooks at a fixed rate; returns gateway response times."""
+    ingest: List[float] = []
+    interval = 1 / args.rate
+
+    async with httpx.AsyncClient(timeout=30) as client:
+
+        async def send(i: int):
+            repo = f"loadtest/repo-{i % args.repos}"
+            body, headers = build_event(repo, i + 1)
+            key = f"{repo}#{i + 1}"
+            tracker.sent[key] = start = time.perf_counter()
+            try:
+                response = await client.post(url, content=body, headers=headers)
+                tracker.statuses[str(response.status_code)] += 1
+            except httpx.HTTPError:
+                tracker.statuses["error"] += 1
+            ingest.append(time.perf_counter() - start)
+
+        begin = time.perf_counter()
+        tasks = []
+        for i in range(args.requests):
+            await asyncio.sleep(max(0.0, begin + i * interval - time.perf_counter()))
+            tasks.append(asyncio.create_task(send(i)))
+        await asyncio.gather(*tasks)
+    return ingest
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def stage_breakdown(text: str) -> Dict[str, dict]:
+    """Per-stage count / mean / p95 of successful runs from the worker's stage histogram (all sources and repos)."""
+    buckets: Dict[str, Dict[float, float]] = defaultdict(lambda: defaultdict(float))
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).startswith("sentinel_worker_stage_seconds"):
+            continue
+        name, labels, value = match.group(1), dict(_LABEL.findall(match.group(2))), float(match.group(3))
+        if labels.get("outcome", "success") != "success":
+            continue
+        stage = labels["stage"]
+        if name.endswith("_bucket"):
+            buckets[stage][float(labels["le"])] += value
+        elif name.endswith("_sum"):
+            totals[stage][0] += value
+        elif name.endswith("_count"):
+            totals[stage][1] += value
+
+    result = {}
+    for stage, (total, count) in totals.items():
+        result[stage] = {
+            "count": int(count),
+            "mean": total / count if count else float("nan"),
+            "p95": _bucket_quantile(buckets[stage], 0.95),
+        }
+    return result
+
+
+def _bucket_quantile(buckets: Dict[float, float], q: float) -> float:
+    """Same linear interpolation as PromQL's histogram_quantile."""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] == 0:
+        return float("nan")
+    rank = q * buckets[bounds[-1]]
+    lower, lower_count = 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - lower_count) / max(buckets[bound] - lower_count, 1e-9)
+        lower, lower_count = bound, buckets[bound]
+    return lower
+
+
+def configure_environment(args, github_port: int, llm_port: int):
+    # Settings are read at import time, so configure them before importing the services
+    os.environ.update({
+        "WEBHOOK_SECRET": SECRET,
+        "GITHUB_API_TOKEN": "load-harness",
+        "GITHUB_API_URL": f"http://127.0.0.1:{github_port}",
+        "LLM_MODEL_PROVIDER": "local",
+        "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "QUEUE_BACKEND": args.queue_backend,
+        "QUEUE_NAME": f"loadtest:{uuid.uuid4().hex[:8]}",
+        "METRICS_INCLUDE_REPO": "false",
+    })
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        os.environ["REDIS_STRATEGY"] = "mock"
+        # The token-bucket limiter is a Lua script, which fakeredis only runs with 'lupa'
+        os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "false")
+
+
+async def start_worker_processes(count: int) -> List[Tuple[asyncio.subprocess.Process, int]]:
+    """Worker processes (with their metrics ports), each running the real worker entry point."""
+    workers = []
+    for i in range(count):
+        port = free_port()
+        env = {
+            **os.environ,
+            "WORKER_PROCESSES": "1",
+            "METRICS_HOST": "127.0.0.1",
+            "METRICS_PORT": str(port),
+            "QUEUE_CONSUMER_NAME": f"loadtest-worker-{i}",
+        }
+        process = await asyncio.create_subprocess_exec(sys.executable, "-m", "review_worker.cli", env=env)
+        workers.append((process, port))
+
+    # Webhooks are timed from the first send, so wait until every worker is up (its metrics server answers)
+    deadline = time.monotonic() + 60
+    async with httpx.AsyncClient(timeout=1) as client:
+        for process, port in workers:
+            while True:
+                if process.returncode is not None:
+                    raise RuntimeError(f"Worker on metrics port {port} exited with code {process.returncode}")
+                try:
+                    await client.get(f"http://127.0.0.1:{port}/metrics")
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Worker on metrics port {port} did not start within 60s")
+                    await asyncio.sleep(0.2)
+    return workers
+
+
+async def stop_worker_processes(workers: List[Tuple[asyncio.subprocess.Process, int]], timeout: float):
+    for process, _ in workers:
+        if process.returncode is None:
+            process.send_signal(signal.SIGTERM)  # Drains like a deploy would
+    for process, _ in workers:
+        try:
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+async def scrape_metrics(ports: List[int]) -> str:
+    """Concatenated /metrics of the worker processes; stage_breakdown sums across them."""
+    texts = []
+    async with httpx.AsyncClient(timeout=5) as client:
+        for port in ports:
+            try:
+                response = await client.get(f"http://127.0.0.1:{port}/metrics")
+                texts.append(response.text)
+            except httpx.HTTPError as e:
+                print(f"Could not scrape worker metrics on port {port}: {e}")
+    return "\n".join(texts)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Webhooks to send")
+    parser.add_argument("--rate", type=float, default=20.0, help="Webhooks per second")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes (pipelines without --redis-url)")
+    parser.add_argument("--repos", type=int, default=10, help="Distinct repositories to spread PRs over")
+    parser.add_argument("--files-per-pr", type=int, default=5)
+    parser.add_argument("--lines-per-file", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per LLM call")
+    parser.add_argument("--github-latency", type=float, default=0.05, help="Seconds per GitHub call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter")
+    parser.add_argument("--queue-backend", default="list")
+    parser.add_argument("--redis-url", help="Use this Redis instead of fakeredis")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for reviews")
+    parser.add_argument("--max-p95", type=float, help="Fail if end-to-end p95 exceeds this (seconds)")
+    parser.add_argument("--min-throughput", type=float, help="Fail if fewer reviews/sec complete")
+    args = parser.parse_args()
+
+    tracker = Tracker()
+    tracker.expected = args.requests
+    github_port, llm_port, gateway_port = free_port(), free_port(), free_port()
+    configure_environment(args, github_port, llm_port)
+
+    from shared.metrics import REGISTRY
+    from api_gateway.main import app as gateway_app
+
+    if not args.redis_url:
+        print(
+            "WARNING: no --redis-url, running on fakeredis. The gateway lifespan is skipped (no admission "
+            "control, no broadcaster) and all workers share this process's event loop, so these numbers "
+            "measure neither multi-worker scaling nor the real gateway path."
+        )
+
+    servers = [
+        await serve(build_fake_github(args, tracker), github_port),
+        await serve(build_fake_llm(args), llm_port),
+        # Without a real Redis, skip the lifespan: its pub/sub listener needs a server
+        await serve(gateway_app, gateway_port, lifespan="on" if args.redis_url else "off"),
+    ]
+
+    pipelines, worker_tasks, worker_processes = [], [], []
+    if args.redis_url:
+        worker_processes = await start_worker_processes(args.workers)
+    else:
+        from review_worker.worker import build_pipeline
+
+        for i in range(args.workers):
+            pipeline = build_pipeline()
+            pipeline.consumer = f"loadtest-worker-{i}"
+            pipelines.append(pipeline)
+        worker_tasks = [asyncio.create_task(p.run()) for p in pipelines]
+
+    print(f"Sending {args.requests} webhooks at {args.rate:g}/s to {args.workers} worker(s)...")
+    begin = time.perf_counter()
+    ingest = await drive(f"http://127.0.0.1:{gateway_port}/webhook/github", args, tracker)
+    try:
+        await asyncio.wait_for(tracker.all_done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        print(f"Timed out with {len(tracker.done)}/{args.requests} reviews posted")
+    elapsed = time.perf_counter() - begin
+
+    if worker_processes:
+        worker_metrics = await scrape_metrics([port for _, port in worker_processes])
+        await stop_worker_processes(worker_processes, timeout=30)
+    else:
+        worker_metrics = REGISTRY.render()
+    for task in worker_tasks:
+        task.cancel()
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
+    for pipeline in pipelines:
+        await pipeline.github_service.close()
+    for server, task in reversed(servers):
+        server.should_exit = True
+        await task
+
+    end_to_end = [tracker.done[key] - tracker.sent[key] for key in tracker.done]
+    throughput = len(end_to_end) / elapsed if elapsed else 0.0
+
+    print(f"\nGateway responses: {dict(tracker.statuses)}")
+    print(f"Ingest      p50 {percentile(ingest, .5) * 1000:8.1f} ms   p99 {percentile(ingest, .99) * 1000:8.1f} ms")
+    print(f"Completed   {len(end_to_end)}/{args.requests} in {elapsed:.1f}s  ({throughput:.2f} reviews/s)")
+    print(
+        f"End-to-end  p50 {percentile(end_to_end, .5):7.2f} s   p95 {percentile(end_to_end, .95):7.2f} s   "
+        f"p99 {percentile(end_to_end, .99):7.2f} s"
+    )
+    print("\nStage        count     mean      p95")
+    for stage, row in stage_breakdown(worker_metrics).items():
+        print(f"{stage:<10} {row['count']:7d} {row['mean']:7.3f}s {row['p95']:7.3f}s")
+
+    failures = []
+    if len(end_to_end) < args.requests:
+        failures.append(f"{args.requests - len(end_to_end)} review(s) never posted")
+    if args.max_p95 is not None and percentile(end_to_end, .95) > args.max_p95:
+        failures.append(f"p95 above {args.max_p95}s")
+    if args.min_throughput is not None and throughput < args.min_throughput:
+        failures.append(f"throughput below {args.min_throughput}/s")
+    if failures:
+        print("\nFAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
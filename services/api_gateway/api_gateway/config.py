@@ -7,5 +7,22 @@ class Settings(SharedSettings):
 
     API_GATEWAY_HOST: str = "localhost"
     API_GATEWAY_PORT: int = 8000
+
+    # Queue writes issued together while an earlier write is in flight
+    GATEWAY_ENQUEUE_BATCH_SIZE: int = 64
+
+    # Admission control (thresholds are queue depths)
+    ADMISSION_DEFER_HIGH_WATER: int = 200  # Defer low-priority GitHub events above this
+    ADMISSION_RESUME_LOW_WATER: int = 100  # Release deferred events below this
+    ADMISSION_MANUAL_HIGH_WATER: int = 500  # Reject manual reviews (429) above this
+    ADMISSION_HARD_LIMIT: int = 2000  # Reject manual reviews (503) and defer all GitHub events above this
+    ADMISSION_LOW_PRIORITY_ACTIONS: list[str] = ["synchronize"]
+    ADMISSION_REFRESH_INTERVAL: float = 1.0
+    ADMISSION_FALLBACK_JOB_SECONDS: float = 30.0  # Assumed per-job time before throughput is known
+    ADMISSION_RELEASE_TIMEOUT: float = 30.0  # Released jobs not confirmed queued by then are released again
+
+    # WebSocket fan-out
+    WS_CLIENT_QUEUE_SIZE: int = 256  # Events buffered per dashboard
+    WS_SLOW_CONSUMER_POLICY: str = "drop"  # or "disconnect"
     
 settings = Settings()
\ No newline at end of file
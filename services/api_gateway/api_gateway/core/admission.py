@@ -0,0 +1,192 @@
+import json
+import math
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Optional
+from fastapi import HTTPException
+from shared.coalesce import JobCoalescer
+from shared.providers.queue import JOBS_DONE_KEY, QueueFactory
+from shared.providers.redis import RedisFactory
+from api_gateway.config import Settings, settings
+
+logger = logging.getLogger("Gateway.Admission")
+
+_CLAIM_DEFERRED_LUA = """
+-- KEYS: deferred list, releasing zset (job -> claim time)
+-- ARGV: max jobs, now, release timeout
+local count = tonumber(ARGV[1])
+-- Jobs a gateway claimed but never confirmed queued (it died in between) go first
+local out = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[3]), 'LIMIT', 0, count)
+for _, job in ipairs(out) do
+    redis.call('ZADD', KEYS[2], ARGV[2], job)
+end
+while #out < count do
+    local job = redis.call('RPOP', KEYS[1])
+    if not job then break end
+    redis.call('ZADD', KEYS[2], ARGV[2], job)
+    table.insert(out, job)
+end
+return out
+"""
+
+
+@dataclass
+class QueueStatus:
+    depth: int = 0
+    deferred: int = 0
+    jobs_per_second: float = 0.0
+    estimated_wait_seconds: float = 0.0
+    updated_at: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class AdmissionController:
+    """
+    Gateway-side backpressure driven by the depth of the job queue.
+
+    Depth and worker throughput are sampled in the background (at most
+    every ADMISSION_REFRESH_INTERVAL), so admission checks never touch Redis.
+    - Above ADMISSION_DEFER_HIGH_WATER, low-priority GitHub events are parked
+      on a deferred list and released once the queue drains below
+      ADMISSION_RESUME_LOW_WATER. A release first moves jobs to a releasing
+      set in one script and removes them once queued, so a gateway dying
+      in between delays them instead of losing them.
+    - Above ADMISSION_MANUAL_HIGH_WATER, manual reviews get 429.
+    - Above ADMISSION_HARD_LIMIT, manual reviews get 503 and every GitHub
+      event is deferred: GitHub does not redeliver failed webhooks by
+      itself, so a rejected event would never be reviewed.
+    Rejections carry a Retry-After based on the estimated wait.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        # Hash tag: the deferred list and releasing set share a cluster slot for the claim script
+        self.deferred_key = f"{{{settings.QUEUE_NAME}:deferred}}"
+        self.releasing_key = f"{self.deferred_key}:releasing"
+        self._claim_script = None
+        self.status = QueueStatus()
+        self._last_done: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Initial queue status refresh failed: {e}")
+        self._task = asyncio.create_task(self._run(), name="admission-refresh")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.settings.ADMISSION_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+                if self.status.deferred and self.status.depth < self.settings.ADMISSION_RESUME_LOW_WATER:
+                    await self._release_deferred()
+            except Exception as e:
+                logger.warning(f"Queue status refresh failed: {e}")
+
+    async def refresh(self):
+        redis = RedisFactory.get_client()
+        depth = await QueueFactory.get_queue(self.settings).depth()
+        deferred, done = await asyncio.gather(
+            redis.llen(self.deferred_key),  # type: ignore
+            redis.get(JOBS_DONE_KEY),
+        )
+        now = time.monotonic()
+
+        done = int(done or 0)
+        rate = self.status.jobs_per_second
+        if self._last_done is not None and self.status.updated_at:
+            sample = max(0, done - self._last_done) / max(now - self.status.updated_at, 1e-3)
+            rate = sample if rate == 0 else 0.7 * rate + 0.3 * sample  # EWMA
+        self._last_done = done
+
+        effective_rate = rate if rate > 0 else 1 / self.settings.ADMISSION_FALLBACK_JOB_SECONDS
+        self.status = QueueStatus(
+            depth=depth,
+            deferred=deferred,
+            jobs_per_second=round(rate, 3),
+            estimated_wait_seconds=round((depth + deferred) / effective_rate, 1),
+            updated_at=now,
+        )
+
+    async def _release_deferred(self):
+        room = self.settings.ADMISSION_RESUME_LOW_WATER - self.status.depth
+        if room <= 0:
+            return
+        redis = RedisFactory.get_client()
+        if self._claim_script is None:
+            self._claim_script = redis.register_script(_CLAIM_DEFERRED_LUA)
+        raw = await self._claim_script(
+            keys=[self.deferred_key, self.releasing_key],
+            args=[room, time.time(), self.settings.ADMISSION_RELEASE_TIMEOUT],
+        )
+        if not raw:
+            return
+
+        coalescer = JobCoalescer(redis, self.settings)
+        jobs = []
+        for item in raw:
+            job = json.loads(item)
+            deferred_at = job.pop("deferred_at", None)
+            if (
+                deferred_at is not None
+                and time.time() - deferred_at >= self.settings.COALESCE_PENDING_TTL
+                and job.get("pr_number") is not None
+            ):
+                # Its pending key has expired, so a later push may have queued the PR meanwhile
+                if not await coalescer.offer(job["repo_name"], job["pr_number"], None):
+                    logger.info(f"Dropped deferred job {job.get('job_id')}: a newer job covers the PR")
+                    continue
+            jobs.append(job)
+
+        if jobs:
+            await QueueFactory.get_queue(self.settings).enqueue_many(jobs)
+        await redis.zrem(self.releasing_key, *raw)
+        logger.info(f"Released {len(jobs)} deferred job(s) into the queue")
+
+    def _retry_after(self) -> dict:
+        seconds = min(3600, max(1, math.ceil(self.status.estimated_wait_seconds)))
+        return {"Retry-After": str(seconds)}
+
+    def check_manual(self):
+        """Raises 429/503 if a manual review should not be queued right now."""
+        self._check_hard_limit()
+        if self.status.depth >= self.settings.ADMISSION_MANUAL_HIGH_WATER:
+            raise HTTPException(
+                status_code=429,
+                detail="Review queue is busy, please retry later",
+                headers=self._retry_after(),
+            )
+
+    def should_defer(self, low_priority: bool) -> bool:
+        """True if a GitHub job should be deferred rather than queued."""
+        if self.status.depth >= self.settings.ADMISSION_HARD_LIMIT:
+            return True
+        return low_priority and self.status.depth >= self.settings.ADMISSION_DEFER_HIGH_WATER
+
+    def _check_hard_limit(self):
+        if self.status.depth >= self.settings.ADMISSION_HARD_LIMIT:
+            raise HTTPException(
+                status_code=503,
+                detail="Review queue is full",
+                headers=self._retry_after(),
+            )
+
+    async def defer(self, job: dict):
+        # Stamped so a release can tell when the job outlived COALESCE_PENDING_TTL
+        entry = json.dumps({**job, "deferred_at": time.time()})
+        await RedisFactory.get_client().lpush(self.deferred_key, entry)  # type: ignore
+
+
+admission = AdmissionController(settings)
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from shared.providers.queue import QueueFactory
+from api_gateway.config import settings
+
+logger = logging.getLogger("Gateway.Batching")
+
+
+class EnqueueBatcher:
+    """
+    Group-commit style batching of queue writes.
+
+    The first job submitted while no write is in flight is sent right away,
+    so an idle gateway adds no latency. Jobs that arrive while a write is in
+    flight wait for it and then go out together in a single pipelined
+    round trip (up to GATEWAY_ENQUEUE_BATCH_SIZE per batch).
+    """
+
+    def __init__(self, max_batch: int):
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, job: dict) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((job, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self):
+        queue = QueueFactory.get_queue(settings)
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            try:
+                ids = await queue.enqueue_many([job for job, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if len(batch) > 1:
+                logger.debug(f"Enqueued {len(batch)} jobs in one round trip")
+            for (_, future), job_id in zip(batch, ids):
+                if not future.done():
+                    future.set_result(job_id)
+
+
+enqueue_batcher = EnqueueBatcher(settings.GATEWAY_ENQUEUE_BATCH_SIZE)
@@ -0,0 +1,133 @@
+import json
+import asyncio
+import logging
+from typing import Iterable, Optional, Set
+from shared.providers.redis import RedisFactory
+from shared.events import EVENTS_CHANNEL
+from api_gateway.config import Settings
+
+logger = logging.getLogger("Gateway.Broadcast")
+
+
+class Subscriber:
+    """
+    One connected dashboard: a bounded outbox plus the repos / job ids it
+    wants. With no filters it receives every event.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.repos: Set[str] = set()
+        self.job_ids: Set[str] = set()
+        self.dropped = 0
+        self.closed = asyncio.Event()
+
+    def subscribe(self, repos: Iterable[str] = (), job_ids: Iterable[str] = ()):
+        self.repos.update(r for r in repos if r)
+        self.job_ids.update(j for j in job_ids if j)
+
+    def unsubscribe(self, repos: Iterable[str] = (), job_ids: Iterable[str] = ()):
+        self.repos.difference_update(repos)
+        self.job_ids.difference_update(job_ids)
+
+    def wants(self, repo: Optional[str], job_id: Optional[str]) -> bool:
+        if not self.repos and not self.job_ids:
+            return True
+        return (repo is not None and repo in self.repos) or (job_id is not None and job_id in self.job_ids)
+
+
+class EventBroadcaster:
+    """
+    Holds the gateway's single subscription to `sentinel_events` and fans
+    each message out to the connected WebSockets in this process.
+
+    A client whose outbox is full is a slow consumer: depending on
+    WS_SLOW_CONSUMER_POLICY its oldest queued event is dropped ("drop") or
+    it is disconnected ("disconnect"), so one stalled browser never holds
+    up the others or grows memory without bound.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._settings: Optional[Settings] = None
+
+    async def start(self, settings: Settings):
+        self._settings = settings
+        self._task = asyncio.create_task(self._run(), name="event-broadcaster")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for subscriber in self.subscribers:
+            subscriber.closed.set()
+        self.subscribers.clear()
+
+    def connect(self) -> Subscriber:
+        assert self._settings is not None, "EventBroadcaster.start() was not called"
+        subscriber = Subscriber(self._settings.WS_CLIENT_QUEUE_SIZE)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        subscriber.closed.set()
+
+    async def _run(self):
+        assert self._settings is not None
+        while True:
+            # Dedicated connection with NO timeout for the long-lived subscription.
+            redis = RedisFactory.create_subscriber(self._settings, socket_timeout=None)
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                logger.info("Broadcaster subscribed to Redis.")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcaster lost Redis subscription: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await redis.aclose()
+
+    def _dispatch(self, data):
+        if not self.subscribers:
+            return
+
+        # Redis sends bytes, so we decode to string
+        text = data.decode("utf-8") if isinstance(data, bytes) else data
+        try:
+            event = json.loads(text)
+            repo, job_id = event.get("repo"), event.get("job_id")
+        except (ValueError, AttributeError):
+            repo = job_id = None
+
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(repo, job_id):
+                self._offer(subscriber, text)
+
+    def _offer(self, subscriber: Subscriber, text: str):
+        try:
+            subscriber.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            subscriber.dropped += 1
+
+        assert self._settings is not None
+        if self._settings.WS_SLOW_CONSUMER_POLICY == "disconnect":
+            logger.warning("Disconnecting slow WebSocket consumer.")
+            self.disconnect(subscriber)
+            return
+
+        # Drop the oldest event to make room for the newest
+        subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(text)
+
+
+broadcaster = EventBroadcaster()
@@ -0,0 +1,62 @@
+import time
+from shared.metrics import Counter, Gauge, Histogram
+from api_gateway.config import settings
+
+
+def repo_label(repo: str) -> str:
+    return repo if settings.METRICS_INCLUDE_REPO else ""
+
+
+HTTP_SECONDS = Histogram(
+    "sentinel_gateway_request_seconds",
+    "Gateway request handling time.",
+    ["method", "route", "status"],
+)
+WEBHOOK_JOBS = Counter(
+    "sentinel_gateway_jobs_total",
+    "Review jobs offered to the gateway, by what happened to them.",
+    ["source", "repo", "status"],
+)
+QUEUE_DEPTH = Gauge(
+    "sentinel_queue_depth",
+    "Jobs waiting in the review queue (as last sampled by the gateway).",
+)
+QUEUE_DEFERRED = Gauge(
+    "sentinel_queue_deferred",
+    "Low-priority jobs parked by admission control.",
+)
+WS_CLIENTS = Gauge(
+    "sentinel_gateway_websocket_clients",
+    "Connected dashboard WebSockets.",
+)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request. Labels use the matched
+    route template (not the raw path) to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
@@ -1,11 +1,17 @@
 from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from api_gateway.routes import webhook
+from api_gateway.routes import history, queue, webhook
+from api_gateway.core.admission import admission
+from api_gateway.core.broadcast import broadcaster
+from api_gateway.core import metrics
 from api_gateway.config import settings
 
 from shared.providers.redis import RedisFactory
+from shared.providers.queue import QueueFactory
 from shared.logging import setup_logging
+from shared.metrics import REGISTRY
 
 import logging
 setup_logging()
@@ -16,8 +22,17 @@ logger = logging.getLogger("API-Gateway.Main")
 async def lifespan(app: FastAPI):
     logger.info("Starting up API Gateway...")
     RedisFactory.get_client(settings)  # Initialize Redis connection pool
+    QueueFactory.get_queue(settings)  # Backend picked by QUEUE_BACKEND
+    await broadcaster.start(settings)  # One sentinel_events subscription per process
+    await admission.start()  # Samples queue depth for backpressure decisions
+    metrics.QUEUE_DEPTH.set_function(lambda: admission.status.depth)
+    metrics.QUEUE_DEFERRED.set_function(lambda: admission.status.deferred)
+    metrics.WS_CLIENTS.set_function(lambda: len(broadcaster.subscribers))
     yield
     logger.info("Shutting down API Gateway...")
+    await admission.stop()
+    await broadcaster.stop()
+    QueueFactory.reset()
     await RedisFactory.close()
 
 app = FastAPI(
@@ -35,7 +50,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(webhook.router, prefix="/webhook", tags=["Webhook"])
+app.include_router(queue.router, prefix="/queue", tags=["Queue"])
+app.include_router(history.router, prefix="/reviews", tags=["Reviews"])
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -45,3 +65,9 @@ async def root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,43 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from shared.history import ReviewHistory
+from shared.providers.redis import RedisFactory
+from api_gateway.config import settings
+
+router = APIRouter()
+
+
+def _history() -> ReviewHistory:
+    return ReviewHistory(RedisFactory.get_client(), settings)
+
+
+@router.get("")
+async def list_reviews(
+    repo: Optional[str] = Query(None, description="owner/name"),
+    pr: Optional[int] = Query(None, description="PR number (requires repo)"),
+    source: Optional[str] = Query(None, description="github or manual"),
+    since: Optional[float] = Query(None, description="Unix time, inclusive"),
+    until: Optional[float] = Query(None, description="Unix time, inclusive"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[float] = Query(None, description="next_cursor of the previous page"),
+    detail: bool = Query(False, description="Include review text and skipped files"),
+):
+    """
+    Completed reviews, newest first. Answered from the history indexes;
+    follow `next_cursor` until it is null.
+    """
+    if pr is not None and not repo:
+        raise HTTPException(status_code=422, detail="Filtering by pr requires repo")
+    items, next_cursor = await _history().query(
+        repo=repo, pr=pr, source=source, since=since, until=until, limit=limit, cursor=cursor, detail=detail
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{job_id}")
+async def get_review(job_id: str):
+    """The full record of one review, including its text."""
+    record = await _history().get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Review not found (or past HISTORY_RETENTION)")
+    return record
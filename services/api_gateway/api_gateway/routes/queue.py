@@ -0,0 +1,64 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from shared.providers.queue import QueueFactory
+from shared.providers.redis import RedisFactory
+from shared.retry import RetryQueue
+from api_gateway.core.admission import admission
+from api_gateway.config import settings
+
+router = APIRouter()
+
+
+def _retries() -> RetryQueue:
+    return RetryQueue(RedisFactory.get_client(), settings)
+
+
+@router.get("/status")
+async def queue_status():
+    """
+    Queue depth and estimated wait for the frontend to poll.
+    Served from the gateway's periodically refreshed snapshot; never hits Redis.
+    """
+    status = admission.status.to_dict()
+    status.pop("updated_at", None)
+    return status
+
+
+@router.get("/retries")
+async def retry_status():
+    """Jobs waiting for a retry and jobs in the dead-letter queue."""
+    scheduled, dead = await _retries().counts()
+    return {"scheduled": scheduled, "dead": dead}
+
+
+@router.get("/dead")
+async def list_dead_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[float] = Query(None, description="next_cursor of the previous page"),
+):
+    """Dead-lettered jobs, most recent failure first."""
+    items, next_cursor = await _retries().list_dead(limit, before=cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/dead/{job_id}")
+async def get_dead_job(job_id: str):
+    entry = await _retries().get_dead(job_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Job not in the dead-letter queue")
+    return entry
+
+
+@router.post("/dead/{job_id}/requeue")
+async def requeue_dead_job(job_id: str):
+    """Puts a dead-lettered job back on the live queue with a fresh attempt count."""
+    if not await _retries().requeue_dead(job_id, QueueFactory.get_queue(settings)):
+        raise HTTPException(status_code=404, detail="Job not in the dead-letter queue")
+    return {"status": "requeued", "job_id": job_id}
+
+
+@router.delete("/dead/{job_id}")
+async def delete_dead_job(job_id: str):
+    if not await _retries().delete_dead(job_id):
+        raise HTTPException(status_code=404, detail="Job not in the dead-letter queue")
+    return {"status": "deleted", "job_id": job_id}
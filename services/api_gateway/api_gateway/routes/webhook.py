@@ -1,10 +1,18 @@
-import logging
 import json
+import time
+import uuid
+import asyncio
+import logging
 from fastapi import APIRouter, Request, Header, WebSocket, WebSocketDisconnect
-from redis.asyncio import Redis
 from pydantic import BaseModel
 from shared.providers.redis import RedisFactory
-from api_gateway.core.utils import verify_signature
+from shared.coalesce import JobCoalescer
+from shared.events import read_job_events
+from api_gateway.core.admission import admission
+from api_gateway.core.broadcast import broadcaster
+from api_gateway.core.batching import enqueue_batcher
+from api_gateway.core.metrics import WEBHOOK_JOBS, repo_label
+from api_gateway.core.utils import json_loads, verify_payload_signature
 from api_gateway.config import settings
 
 router = APIRouter()
@@ -15,30 +23,69 @@ async def handle_github_webhook(request: Request, x_hub_signature_256: str = Hea
     """
     1. Validates the webhook.
     2. Filters for 'pull_request' events.
-    3. Pushes valid events to Redis for async processing.
+    3. Applies admission control (defers low-priority events when busy, every event when full).
+    4. Drops redeliveries and coalesces pushes to an already queued PR.
+    5. Pushes valid events to Redis for async processing.
     """
-    await verify_signature(request, x_hub_signature_256)
-    
-    payload = await request.json()
-    event_type = request.headers.get("X-GitHub-Event")
+    # Read the raw body once: it is both what GitHub signed and what we parse
+    body = await request.body()
+    verify_payload_signature(body, x_hub_signature_256)
 
-    # We only care about opened or synchronized (updated) PRs
+    # We only care about opened or synchronized (updated) PRs; don't parse anything else
+    event_type = request.headers.get("X-GitHub-Event")
     if event_type == "pull_request":
+        payload = json_loads(body)
         action = payload.get("action")
         if action in ["opened", "synchronize"]:
             job_data = {
+                "job_id": uuid.uuid4().hex,
                 "repo_name": payload["repository"]["full_name"],
                 "pr_number": payload["number"],
-                "installation_id": payload.get("installation", {}).get("id")
+                "installation_id": payload.get("installation", {}).get("id"),
+                "head_sha": payload.get("pull_request", {}).get("head", {}).get("sha"),
+                "queued_at": time.time(),
             }
-            
-            # Push to Redis Queue for async processing
-            redis = RedisFactory.get_client()
-            await redis.lpush("review_jobs", json.dumps(job_data)) # type: ignore
-            
+            low_priority = (
+                action in settings.ADMISSION_LOW_PRIORITY_ACTIONS
+                or payload.get("sender", {}).get("type") == "Bot"
+            )
+            defer = admission.should_defer(low_priority)
+
+            coalescer = JobCoalescer(RedisFactory.get_client(), settings)
+            delivery_id = request.headers.get("X-GitHub-Delivery")
+            if await coalescer.is_duplicate_delivery(delivery_id):
+                logger.info(f"Ignored redelivery for PR #{job_data['pr_number']}")
+                WEBHOOK_JOBS.labels("github", repo_label(job_data["repo_name"]), "duplicate").inc()
+                return {"status": "duplicate"}
+
+            try:
+                if not await coalescer.offer(job_data["repo_name"], job_data["pr_number"], job_data["head_sha"]):
+                    logger.info(f"Coalesced PR #{job_data['pr_number']} into pending job for {job_data['repo_name']}")
+                    WEBHOOK_JOBS.labels("github", repo_label(job_data["repo_name"]), "coalesced").inc()
+                    return {"status": "coalesced"}
+
+                if defer:
+                    await admission.defer(job_data)
+                    logger.info(f"Deferred PR #{job_data['pr_number']} for {job_data['repo_name']} (queue busy)")
+                    WEBHOOK_JOBS.labels("github", repo_label(job_data["repo_name"]), "deferred").inc()
+                    return {"status": "deferred", "job_id": job_data["job_id"]}
+
+                # Push to Redis Queue for async processing (batched with concurrent webhooks)
+                await enqueue_batcher.submit(job_data)
+            except Exception:
+                # Nothing was queued: let GitHub's redelivery and later pushes through again
+                logger.exception(f"Failed to queue PR #{job_data['pr_number']} for {job_data['repo_name']}")
+                try:
+                    await coalescer.abandon(delivery_id, job_data["repo_name"], job_data["pr_number"])
+                except Exception as e:
+                    logger.error(f"Failed to release coalescing keys: {e}")
+                raise
+
             logger.info(f"Queued PR #{job_data['pr_number']} for {job_data['repo_name']}")
-            return {"status": "queued"}
+            WEBHOOK_JOBS.labels("github", repo_label(job_data["repo_name"]), "queued").inc()
+            return {"status": "queued", "job_id": job_data["job_id"]}
 
+    WEBHOOK_JOBS.labels("github", "", "ignored").inc()
     return {"status": "ignored"}
 
 
@@ -50,48 +97,146 @@ class ManualReviewRequest(BaseModel):
 async def manual_review_endpoint(payload: ManualReviewRequest):
     """
     Accepts raw code from Frontend and queues it for the Worker.
+    Answers 429/503 with Retry-After while the queue is over its limits.
     """
+    admission.check_manual()
+
     job_data = {
+        "job_id": uuid.uuid4().hex,
         "source": "manual",
         "code": payload.code,
         "repo_name": payload.repo_name,
-        "pr_number": 0
+        "pr_number": 0,
+        "queued_at": time.time(),
     }
     
-    redis = RedisFactory.get_client()
-    await redis.lpush("review_jobs", json.dumps(job_data)) # type: ignore
+    await enqueue_batcher.submit(job_data)
+    WEBHOOK_JOBS.labels("manual", repo_label(payload.repo_name), "queued").inc()
     
-    return {"status": "queued", "message": "Manual review started"}
+    return {"status": "queued", "message": "Manual review started", "job_id": job_data["job_id"]}
 
     
+# Seconds a replayed event's live copy (still in flight from pub/sub) is dropped
+REPLAY_DEDUPE_WINDOW = 10.0
+
+
+def _event_job_id(data: str):
+    try:
+        return json.loads(data).get("job_id")
+    except (ValueError, AttributeError):
+        return None
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    """
+    Streams `sentinel_events` to the browser from the gateway's shared
+    subscription. Filter with `?repo=owner/name&job_id=...` (repeatable), or
+    send {"action": "subscribe" | "unsubscribe", "repos": [...], "job_ids": [...]}.
+    Without filters every event is delivered. Subscribing to a job id first
+    replays the events that job has already logged.
+    """
     await websocket.accept()
-    
-    # Create a DEDICATED connection with NO timeout for this long-lived socket.
-    # We cannot use the shared pool if it has a default timeout.
-    redis_ws = Redis.from_url(settings.REDIS_URL, socket_timeout=None)
-    pubsub = redis_ws.pubsub()
-    
-    await pubsub.subscribe("sentinel_events")
-    logger.info("WebSocket connected and subscribed to Redis.")
 
-    try:
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                # Forward Redis message to Browser
-                # Redis sends bytes, so we decode to string
-                data = message["data"]
-                if isinstance(data, bytes):
-                    data = data.decode("utf-8")
-                    
+    subscriber = broadcaster.connect()
+    # Replays run in the sender task, so only one task ever writes to the socket
+    replay_requests: asyncio.Queue[list] = asyncio.Queue()
+    # Job id awaiting replay -> live events already sent for it (left out of the replay)
+    awaiting: dict[str, set[str]] = {}
+    # Replayed event -> deadline until which a late live copy of it is dropped
+    replayed: dict[str, float] = {}
+    loop = asyncio.get_running_loop()
+
+    def request_replay(job_ids: list):
+        job_ids = [j for j in job_ids if j]
+        for job_id in job_ids:
+            awaiting.setdefault(job_id, set())
+        if job_ids:
+            replay_requests.put_nowait(job_ids)
+
+    async def replay(job_ids: list):
+        # Subscribed before reading the log, so nothing falls in between
+        for job_id in job_ids:
+            already_sent = awaiting.pop(job_id, set())
+            for data in await read_job_events(RedisFactory.get_client(), job_id):
+                if data in already_sent:
+                    continue
+                replayed[data] = loop.time() + REPLAY_DEDUPE_WINDOW
                 await websocket.send_text(data)
-                
+
+    async def forward(data: str):
+        if replayed:
+            now = loop.time()
+            for key in [key for key, deadline in replayed.items() if deadline < now]:
+                del replayed[key]
+            if replayed.pop(data, None) is not None:
+                return  # Already sent by a replay
+        if awaiting:
+            job_id = _event_job_id(data)
+            if job_id in awaiting:
+                awaiting[job_id].add(data)
+        # Forward Redis message to Browser
+        await websocket.send_text(data)
+
+    job_ids = websocket.query_params.getlist("job_id")
+    request_replay(job_ids)
+    subscriber.subscribe(repos=websocket.query_params.getlist("repo"), job_ids=job_ids)
+    logger.info("WebSocket connected.")
+
+    async def send_events():
+        live = asyncio.ensure_future(subscriber.queue.get())
+        request = asyncio.ensure_future(replay_requests.get())
+        try:
+            while True:
+                await asyncio.wait({live, request}, return_when=asyncio.FIRST_COMPLETED)
+                if request.done():
+                    job_ids = request.result()
+                    request = asyncio.ensure_future(replay_requests.get())
+                    await replay(job_ids)
+                if live.done():
+                    data = live.result()
+                    live = asyncio.ensure_future(subscriber.queue.get())
+                    await forward(data)
+        finally:
+            live.cancel()
+            request.cancel()
+
+    async def receive_commands():
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(command, dict):
+                continue
+            repos, job_ids = command.get("repos") or [], command.get("job_ids") or []
+            if command.get("action") == "subscribe":
+                request_replay(job_ids)
+                subscriber.subscribe(repos, job_ids)
+            elif command.get("action") == "unsubscribe":
+                subscriber.unsubscribe(repos, job_ids)
+
+    tasks = [
+        asyncio.create_task(send_events()),
+        asyncio.create_task(receive_commands()),
+        asyncio.create_task(subscriber.closed.wait()),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception():
+                raise task.exception()  # type: ignore
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected.")
     except Exception as e:
         logger.error(f"WebSocket Error: {e}")
     finally:
-        # Close the dedicated connection when the socket closes
-        await pubsub.unsubscribe("sentinel_events")
-        await redis_ws.close()
\ No newline at end of file
+        for task in tasks:
+            task.cancel()
+        broadcaster.disconnect(subscriber)
+        if subscriber.dropped:
+            logger.info(f"WebSocket closed after dropping {subscriber.dropped} event(s).")
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass  # Already closed by the client
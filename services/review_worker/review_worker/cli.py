@@ -2,6 +2,8 @@ import sys
 import asyncio
 
 from review_worker.worker import main as start_worker
+from review_worker.supervisor import WorkerSupervisor
+from review_worker.config import settings
 from shared.logging import setup_logging
 
 import logging
@@ -15,10 +17,13 @@ def run():
     Entry point to start the Review Worker.
     """
     logger.info(f"Starting Review Worker...")
-    logger.info(f"Listening to Queue: review_jobs")
+    logger.info(f"Listening to Queue: {settings.QUEUE_NAME} ({settings.QUEUE_BACKEND})")
 
     try:
-        asyncio.run(start_worker())
+        if settings.WORKER_PROCESSES > 1:
+            WorkerSupervisor(settings).run()
+        else:
+            asyncio.run(start_worker())
     except asyncio.CancelledError:
         logger.info("Review Worker Cancelled. Shutting down...")
     except KeyboardInterrupt:
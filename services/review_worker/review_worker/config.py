@@ -1,5 +1,5 @@
 from shared.config import Settings as SharedSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(SharedSettings):
 
@@ -8,6 +8,100 @@ class Settings(SharedSettings):
     LLM_BASE_URL: Optional[str] = "http://localhost:1234/v1" # For local or custom providers
     LLM_TEMPERATURE: float = 0.5
     LLM_API_KEY: str = ""
-    LLM_MAX_TOKENS: int = 2048
+    LLM_MAX_TOKENS: int = 2048  # Max tokens the model may generate per call
+    LLM_CONTEXT_TOKENS: int = 4096  # Context window of the model (prompt + completion)
+    LLM_PROMPT_OVERHEAD_TOKENS: int = 400  # Reserved for the system prompt and framing
+    LLM_MAX_CONCURRENCY: int = 4  # Parallel LLM calls per worker process, shared by all its reviews; with LLM_RATE_LIMIT_ENABLED, the adaptive limit it starts from
 
-settings = Settings()
\ No newline at end of file
+    # Cluster-wide LLM rate limits (shared by all workers) and adaptive concurrency per worker
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_REQUESTS_PER_MINUTE: int = 60
+    LLM_TOKENS_PER_MINUTE: int = 200_000
+    LLM_ADAPTIVE_MIN_CONCURRENCY: int = 1
+    LLM_ADAPTIVE_MAX_CONCURRENCY: int = 16
+    LLM_LATENCY_TARGET: float = 60.0  # Seconds; slower calls count as overload
+    LLM_OVERLOAD_RETRIES: int = 2  # Retries of a 429 / timeout by the limiter (the client's own are off)
+
+    # Provider pool (LLM_MODEL_PROVIDER="pool"): JSON list of endpoints, each overriding the
+    # LLM_* settings above, e.g. [{"name": "gpu", "provider": "local", "base_url": "http://gpu:1234/v1",
+    # "weight": 3}, {"name": "openai", "provider": "openai", "model": "gpt-4o-mini", "api_key": "..."}]
+    LLM_POOL: List[Dict[str, Any]] = []
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_QUANTILE: float = 0.95  # Hedge once a call runs longer than this quantile of its backend
+    LLM_HEDGE_INITIAL_DELAY: float = 30.0  # Hedge delay until a backend has latency samples
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+    LLM_POOL_EJECT_FAILURES: int = 3  # Consecutive failures / lost hedges that take a backend out
+    LLM_POOL_EJECT_SECONDS: float = 30.0
+
+    # Stream review text to dashboards as it is generated
+    LLM_STREAMING_ENABLED: bool = True
+    STREAM_FLUSH_INTERVAL: float = 0.2  # Seconds between 'chunk' events per job
+    STREAM_FLUSH_CHARS: int = 2048  # Flush early once this much text is buffered
+
+    # GitHub client pool and conditional-request cache
+    GITHUB_API_URL: str = "https://api.github.com"  # GitHub Enterprise or a local stub
+    GITHUB_MAX_CONNECTIONS: int = 20
+    GITHUB_MAX_KEEPALIVE: int = 10
+    GITHUB_HTTP_TIMEOUT: float = 30.0
+    GITHUB_CACHE_SIZE: int = 1000  # Responses kept for ETag / Last-Modified revalidation
+    GITHUB_MAX_PATCH_BYTES: int = 100_000  # Larger single-file patches are skipped with a note
+    GITHUB_MAX_DIFF_BYTES: int = 1_000_000  # Total diff size kept in memory per job
+    GITHUB_RATE_LIMIT_RESERVE: int = 50  # Stop calling with the token below this many requests
+    GITHUB_SECONDARY_BACKOFF_BASE: float = 60.0
+    GITHUB_SECONDARY_BACKOFF_MAX: float = 900.0
+
+    # Prometheus exporter (GET /metrics)
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 9100
+
+    # Pipeline: workers per stage and the size of the hand-off queue between stages
+    WORKER_FETCH_CONCURRENCY: int = 4
+    WORKER_ANALYZE_CONCURRENCY: int = 2
+    WORKER_POST_CONCURRENCY: int = 4
+    WORKER_STAGE_QUEUE_SIZE: int = 16
+
+    # Process supervisor: worker processes, crash-restart backoff and graceful drain on SIGTERM
+    WORKER_PROCESSES: int = 1  # >1 forks that many worker processes under a supervisor
+    WORKER_RESTART_BACKOFF_BASE: float = 1.0
+    WORKER_RESTART_BACKOFF_MAX: float = 60.0
+    WORKER_DRAIN_TIMEOUT: float = 60.0  # Seconds in-flight reviews get to finish before being requeued
+
+    # Which changed files are reviewed at all (fnmatch patterns on the path)
+    REVIEW_INCLUDE_PATHS: List[str] = ["*.py"]
+    REVIEW_EXCLUDE_PATHS: List[str] = [
+        "migrations/*", "*/migrations/*", "vendor/*", "*/vendor/*", "third_party/*", "*_pb2.py", "*_pb2_grpc.py",
+    ]
+
+    # Pre-LLM triage: drop trivial hunks and generated files, LGTM a PR with nothing left
+    TRIAGE_ENABLED: bool = True
+    TRIAGE_GENERATED_MARKERS: List[str] = ["@generated", "DO NOT EDIT", "Code generated by", "Generated by Django"]
+    TRIAGE_COMMENT_PREFIXES: Dict[str, List[str]] = {
+        ".py": ["#"], ".rb": ["#"], ".sh": ["#"], ".yml": ["#"], ".yaml": ["#"],
+        ".js": ["//"], ".ts": ["//"], ".go": ["//"], ".java": ["//"],
+    }
+    # Extension -> [opening, closing] delimiter of block comments
+    TRIAGE_BLOCK_COMMENTS: Dict[str, List[str]] = {
+        ".js": ["/*", "*/"], ".ts": ["/*", "*/"], ".go": ["/*", "*/"], ".java": ["/*", "*/"],
+    }
+
+    # Per-file review cache
+    REVIEW_CACHE_ENABLED: bool = True
+    REVIEW_CACHE_TTL: int = 7 * 86_400
+    REVIEW_CACHE_MAX_ENTRIES: int = 50_000
+
+    # Near-duplicate reuse: MinHash/LSH over patch shingles finds files reviewed before in another PR
+    SIMILARITY_ENABLED: bool = True
+    SIMILARITY_THRESHOLD: float = 0.85  # Estimated Jaccard similarity needed to reuse findings
+    SIMILARITY_BANDS: int = 16  # LSH bands x rows = MinHash signature length
+    SIMILARITY_ROWS: int = 8
+    SIMILARITY_SHINGLE_SIZE: int = 5  # Tokens per shingle
+    SIMILARITY_MAX_SHINGLES: int = 2000  # Shingles hashed per patch (bounds the cost of huge patches)
+    SIMILARITY_MIN_TOKENS: int = 30  # Smaller patches are too generic to match safely
+    SIMILARITY_MAX_CANDIDATES: int = 20  # Signatures compared per lookup
+    SIMILARITY_TTL: int = 30 * 86_400
+
+    # Incremental review: only review commits pushed since the last reviewed head
+    INCREMENTAL_REVIEW_ENABLED: bool = True
+    REVIEW_STATE_TTL: int = 30 * 86_400
+
+settings = Settings()
@@ -0,0 +1,72 @@
+from shared.metrics import Counter, Gauge, Histogram
+from review_worker.config import settings
+
+
+def repo_label(repo: str) -> str:
+    return repo if settings.METRICS_INCLUDE_REPO else ""
+
+
+DEQUEUE_WAIT = Histogram(
+    "sentinel_worker_dequeue_wait_seconds",
+    "Time spent waiting on the job queue per read.",
+)
+STAGE_SECONDS = Histogram(
+    "sentinel_worker_stage_seconds",
+    "Time spent in each pipeline stage (fetch = get_pr_diff, analyze = analyze_code, post = post_comment), "
+    "by outcome (success, deferred, failed).",
+    ["stage", "source", "repo", "outcome"],
+)
+JOBS = Counter(
+    "sentinel_worker_jobs_total",
+    "Jobs that left the pipeline, by outcome (completed, skipped, deferred, retried, dead_lettered, failed).",
+    ["source", "repo", "outcome"],
+)
+STAGE_QUEUE_SIZE = Gauge(
+    "sentinel_worker_stage_queue_size",
+    "Jobs waiting in front of each pipeline stage.",
+    ["stage"],
+)
+LLM_TOKENS = Counter(
+    "sentinel_llm_tokens_total",
+    "LLM tokens sent (in) and generated (out); estimated when the provider reports no usage.",
+    ["direction"],
+)
+LLM_CALL_SECONDS = Histogram(
+    "sentinel_llm_call_seconds",
+    "Duration of individual LLM calls.",
+)
+LLM_BACKEND_CALLS = Counter(
+    "sentinel_llm_backend_calls_total",
+    "Calls per pooled LLM backend, by outcome (success, error, slow = lost a hedge).",
+    ["backend", "outcome"],
+)
+LLM_HEDGES = Counter(
+    "sentinel_llm_hedges_total",
+    "Hedged LLM calls, by the backend the hedge went to.",
+    ["backend"],
+)
+TRIAGE = Counter(
+    "sentinel_triage_dropped_total",
+    "Files and hunks dropped by pre-LLM triage, by reason.",
+    ["kind", "reason"],
+)
+REVIEW_CACHE = Counter(
+    "sentinel_review_cache_requests_total",
+    "Per-file review cache lookups.",
+    ["result"],
+)
+SIMILARITY = Counter(
+    "sentinel_similarity_lookups_total",
+    "Near-duplicate lookups for files missing from the review cache (hit = earlier findings reused).",
+    ["result"],
+)
+SIMILARITY_TOKENS_SAVED = Counter(
+    "sentinel_similarity_tokens_saved_total",
+    "Estimated LLM tokens not spent thanks to near-duplicate reuse.",
+    ["direction"],
+)
+SIMILARITY_SCORE = Histogram(
+    "sentinel_similarity_score",
+    "Estimated similarity of the best candidate found per lookup.",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.0),
+)
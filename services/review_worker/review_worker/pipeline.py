@@ -0,0 +1,506 @@
+import time
+import uuid
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from redis import asyncio as aioredis
+from shared.coalesce import JobCoalescer
+from shared.events import ErrorEvent, EventBus, LogEvent, SuccessEvent
+from shared.history import ReviewHistory
+from shared.interfaces import JobQueueStrategy, QueuedJob
+from shared.providers.queue import JOBS_DONE_KEY, default_consumer_name
+from shared.retry import RetryQueue
+from review_worker.config import Settings
+from review_worker.metrics import DEQUEUE_WAIT, JOBS, STAGE_QUEUE_SIZE, STAGE_SECONDS, repo_label
+from review_worker.services.github import GitHubService, GitHubThrottled, PRDiff
+from review_worker.services.reviewer import LGTM, ReviewerAgent
+from review_worker.services.state import ReviewStateStore
+from review_worker.services.streaming import ReviewStreamPublisher
+from review_worker.services.triage import DiffTriage
+
+logger = logging.getLogger("Review-Worker.Pipeline")
+
+
+@dataclass
+class ReviewJob:
+    """A job travelling through the pipeline, enriched by each stage."""
+    payload: dict
+    repo: str
+    pr_id: int
+    source: str
+    job_id: str
+    head_sha: Optional[str] = None
+    base_sha: Optional[str] = None  # Set when only changes since this commit are reviewed
+    handle: Optional[QueuedJob] = None
+    diff_text: str = ""
+    skipped_files: List[Tuple[str, str]] = field(default_factory=list)
+    review: str = ""
+    dequeued_at: float = field(default_factory=time.time)
+    timings: Dict[str, float] = field(default_factory=dict)  # Seconds spent per stage
+    tokens: Dict[str, int] = field(default_factory=dict)  # LLM tokens ("input", "output")
+
+    @classmethod
+    def from_queued(cls, queued: QueuedJob) -> "ReviewJob":
+        payload = queued.data
+        return cls(
+            payload=payload,
+            repo=payload.get("repo_name", "Unknown Repo"),
+            pr_id=payload.get("pr_number", 0),
+            source=payload.get("source", "github"),
+            job_id=payload.get("job_id") or queued.id or uuid.uuid4().hex,
+            head_sha=payload.get("head_sha"),
+            handle=queued,
+        )
+
+    @property
+    def pr_key(self) -> str:
+        return JobCoalescer.pr_key(self.repo, self.pr_id)
+
+    @property
+    def attempt(self) -> int:
+        """Failed attempts so far (0 on the first run)."""
+        return int(self.payload.get("attempt", 0))
+
+
+StageHandler = Callable[[ReviewJob], Awaitable[Optional[ReviewJob]]]
+
+
+class ReviewPipeline:
+    """
+    Runs review jobs through three stages: fetch -> analyze -> post.
+
+    Each stage has its own pool of workers and hands jobs to the next stage
+    through a bounded queue, so the GitHub fetch for one job overlaps with
+    the LLM call of another. When a downstream stage falls behind, the
+    bounded queues push back all the way to the Redis consumer.
+
+    A job is acked on the job queue only once it leaves the pipeline, so
+    with the stream backend a crash mid-review leaves it claimable.
+
+    PR jobs are checked against the newest pushed head between stages; a
+    superseded job is dropped, and its in-flight LLM call is cancelled when
+    the newer head reaches this worker.
+
+    A job that finds the GitHub token out of quota is set aside and put
+    back into its stage once the quota resets, freeing the stage worker for
+    jobs that need no GitHub call (e.g. LLM analysis).
+
+    A job that fails in any stage is handed to the RetryQueue in the
+    background: it returns to the job queue after a backoff, or goes to the
+    dead-letter queue once its error class runs out of attempts. The stage
+    worker moves straight on to its next job.
+
+    `stop()` drains the pipeline: no new jobs are read, jobs already taken
+    get WORKER_DRAIN_TIMEOUT to finish, and whatever is left is handed back
+    to the job queue for another worker.
+    """
+
+    def __init__(
+        self,
+        redis: aioredis.Redis,
+        queue: JobQueueStrategy,
+        github_service: GitHubService,
+        reviewer: ReviewerAgent,
+        settings: Settings,
+        events_redis: Optional[aioredis.Redis] = None,
+    ):
+        self.redis = redis
+        self.queue = queue
+        self.consumer = default_consumer_name(settings)
+        self.coalescer = JobCoalescer(redis, settings)
+        self.events = EventBus(events_redis or redis, settings)
+        self.review_state = ReviewStateStore(redis, settings)
+        self.triage = DiffTriage(settings) if settings.TRIAGE_ENABLED else None
+        self.retries = RetryQueue(redis, settings) if settings.RETRY_ENABLED else None
+        self.history = ReviewHistory(redis, settings) if settings.HISTORY_ENABLED else None
+        self.github_service = github_service
+        self.reviewer = reviewer
+        self.settings = settings
+
+        size = settings.WORKER_STAGE_QUEUE_SIZE
+        self.fetch_queue: asyncio.Queue[ReviewJob] = asyncio.Queue(maxsize=size)
+        self.analyze_queue: asyncio.Queue[ReviewJob] = asyncio.Queue(maxsize=size)
+        self.post_queue: asyncio.Queue[ReviewJob] = asyncio.Queue(maxsize=size)
+        for stage, stage_queue in (("fetch", self.fetch_queue), ("analyze", self.analyze_queue), ("post", self.post_queue)):
+            STAGE_QUEUE_SIZE.labels(stage).set_function(stage_queue.qsize)
+
+        # PR key -> (head SHA, LLM task) for reviews currently being analyzed
+        self._inflight: dict[str, tuple[Optional[str], asyncio.Task]] = {}
+        # Jobs waiting out a GitHub rate limit
+        self._deferred: set[asyncio.Task] = set()
+        # Failed jobs being handed to the retry queue
+        self._failing: set[asyncio.Task] = set()
+        # Job id -> job, for every job read from the queue and not yet acked
+        self._held: dict[str, ReviewJob] = {}
+        self._parked: set[str] = set()  # Held jobs that are waiting out a rate limit
+        self._idle = asyncio.Event()  # Set while no held job is being worked on
+        self._idle.set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Starts every stage and the queue consumer; runs until stopped or cancelled."""
+        stages = [
+            ("fetch", self.fetch_queue, self._fetch, self.analyze_queue, self.settings.WORKER_FETCH_CONCURRENCY),
+            ("analyze", self.analyze_queue, self._analyze, self.post_queue, self.settings.WORKER_ANALYZE_CONCURRENCY),
+            ("post", self.post_queue, self._post, None, self.settings.WORKER_POST_CONCURRENCY),
+        ]
+
+        await self.events.start()
+        consumer = asyncio.create_task(self._consume(), name="consume")
+        tasks = [consumer]
+        tasks.append(asyncio.create_task(self._heartbeat(), name="queue-heartbeat"))
+        if self.retries is not None:
+            tasks.append(asyncio.create_task(self.retries.run_promoter(self.queue), name="retry-promoter"))
+        for name, inbox, handler, outbox, concurrency in stages:
+            for i in range(max(1, concurrency)):
+                tasks.append(asyncio.create_task(
+                    self._stage_worker(name, inbox, handler, outbox),
+                    name=f"{name}-{i}",
+                ))
+
+        try:
+            await self._stopping.wait()
+            await self._drain(consumer)
+        finally:
+            for task in [*tasks, *self._deferred]:
+                task.cancel()
+            await asyncio.gather(*tasks, *self._deferred, return_exceptions=True)
+            # Not cancelled: a job whose retry is scheduled but not yet acked would
+            # otherwise be requeued as well and run twice
+            await asyncio.gather(*self._failing, return_exceptions=True)
+            await self._requeue_held()
+            await self.events.stop()
+
+    def stop(self):
+        """Stops reading new jobs; `run()` returns once the pipeline has drained."""
+        if not self._stopping.is_set():
+            logger.info("Stopping: no new jobs will be read.")
+            self._stopping.set()
+
+    async def _drain(self, consumer: asyncio.Task):
+        async def finished():
+            await consumer  # Returns after the dequeue in progress
+            await self._idle.wait()
+
+        timeout = self.settings.WORKER_DRAIN_TIMEOUT
+        logger.info(f"Draining {len(self._held)} in-flight job(s) (up to {timeout:.0f}s)...")
+        try:
+            await asyncio.wait_for(finished(), timeout=timeout)
+            logger.info("Drained all in-flight jobs.")
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain deadline passed with {len(self._held)} job(s) unfinished.")
+
+    async def _requeue_held(self):
+        """Hands jobs this worker will not finish back to the job queue."""
+        jobs = [job for job in self._held.values() if job.handle is not None]
+        self._held.clear()
+        self._parked.clear()
+        self._idle.set()
+        for job in jobs:
+            try:
+                await self.queue.requeue(job.handle)  # type: ignore[arg-type]
+            except Exception as e:
+                logger.error(f"Failed to requeue job {job.job_id}: {e}")
+        if jobs:
+            logger.info(f"Requeued {len(jobs)} unfinished job(s).")
+
+    async def _heartbeat(self):
+        """Keeps the claim on every held job (including deferred ones) alive while it is worked on."""
+        while True:
+            await asyncio.sleep(self.settings.QUEUE_HEARTBEAT_INTERVAL)
+            handles = [job.handle for job in list(self._held.values()) if job.handle is not None]
+            if not handles:
+                continue
+            try:
+                await self.queue.touch(self.consumer, handles)  # type: ignore[arg-type]
+            except Exception as e:
+                logger.warning(f"Failed to refresh the claim on {len(handles)} job(s): {e}")
+
+    async def _consume(self):
+        """Reads jobs from the job queue and feeds the fetch stage."""
+        while not self._stopping.is_set():
+            try:
+                with DEQUEUE_WAIT.time():
+                    batch = await self.queue.dequeue(
+                        self.consumer, count=self.settings.QUEUE_READ_COUNT, timeout=2
+                    )
+                jobs = [ReviewJob.from_queued(queued) for queued in batch]
+                for job in jobs:
+                    self._held[job.job_id] = job
+                self._update_idle()
+                for job in jobs:
+                    # Blocks while the fetch stage is saturated (backpressure)
+                    await self.fetch_queue.put(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading job: {e}")
+                await asyncio.sleep(1)
+
+    async def _stage_worker(
+        self,
+        name: str,
+        inbox: asyncio.Queue,
+        handler: StageHandler,
+        outbox: Optional[asyncio.Queue],
+    ):
+        while True:
+            job = await inbox.get()
+            labels = (job.source, repo_label(job.repo))
+            start = time.perf_counter()
+            try:
+                result = await handler(job)
+                job.timings[name] = time.perf_counter() - start
+                STAGE_SECONDS.labels(name, *labels, "success").observe(job.timings[name])
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+                else:
+                    JOBS.labels(*labels, "completed" if result is not None else "skipped").inc()
+                    await self._ack(job)
+            except asyncio.CancelledError:
+                raise
+            except GitHubThrottled as e:
+                STAGE_SECONDS.labels(name, *labels, "deferred").observe(time.perf_counter() - start)
+                logger.warning(f"{e}; deferring PR #{job.pr_id} in {job.repo}")
+                JOBS.labels(*labels, "deferred").inc()
+                self._defer(job, inbox, e.retry_after)
+            except Exception as e:
+                STAGE_SECONDS.labels(name, *labels, "failed").observe(time.perf_counter() - start)
+                logger.error(f"Error processing job in {name} stage: {e}")
+                task = asyncio.create_task(self._fail(job, e, labels))
+                self._failing.add(task)
+                task.add_done_callback(self._failing.discard)
+            finally:
+                inbox.task_done()
+
+    def _update_idle(self):
+        if self._held.keys() <= self._parked:
+            self._idle.set()
+        else:
+            self._idle.clear()
+
+    def _defer(self, job: ReviewJob, inbox: asyncio.Queue, delay: float):
+        # A parked job does not hold up draining; it is requeued instead
+        self._parked.add(job.job_id)
+        self._update_idle()
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._parked.discard(job.job_id)
+            self._update_idle()
+            await inbox.put(job)
+
+        task = asyncio.create_task(requeue())
+        self._deferred.add(task)
+        task.add_done_callback(self._deferred.discard)
+
+    async def _fail(self, job: ReviewJob, error: Exception, labels: Tuple[str, str]):
+        """Schedules a retry of a failed job (or dead-letters it), then acks it."""
+        outcome, message = "failed", f"Review failed: {error}"
+        if self.retries is not None:
+            try:
+                delay = await self.retries.fail({**job.payload, "job_id": job.job_id}, error)
+                if delay is None:
+                    outcome, message = "dead_lettered", f"Review failed after {job.attempt + 1} attempt(s): {error}"
+                else:
+                    outcome, message = "retried", f"Review failed ({error}); retrying in {delay:.0f}s"
+            except Exception as e:
+                logger.error(f"Failed to schedule retry of job {job.job_id}: {e}")
+
+        JOBS.labels(*labels, outcome).inc()
+        self.events.publish(ErrorEvent(job.job_id, job.repo, message=message))
+        await self._ack(job)
+
+    async def _ack(self, job: ReviewJob):
+        """Acks a job leaving the pipeline and counts it toward throughput."""
+        self._held.pop(job.job_id, None)
+        self._update_idle()
+        try:
+            if job.handle is not None:
+                await self.queue.ack(job.handle)
+            await self.redis.incr(JOBS_DONE_KEY)
+        except Exception as e:
+            logger.error(f"Failed to ack job {job.job_id}: {e}")
+
+    def _log(self, job: ReviewJob, message: str):
+        self.events.publish(LogEvent(job.job_id, job.repo, message=message))
+
+    async def _is_superseded(self, job: ReviewJob) -> bool:
+        if job.source != "github":
+            return False
+        if await self.coalescer.is_current(job.repo, job.pr_id, job.head_sha):
+            return False
+        logger.info(f"Dropping PR #{job.pr_id} in {job.repo}: head {job.head_sha} was superseded.")
+        return True
+
+    def _cancel_stale_analysis(self, job: ReviewJob):
+        inflight = self._inflight.get(job.pr_key)
+        if inflight and inflight[0] != job.head_sha:
+            logger.info(f"Cancelling stale review of PR #{job.pr_id} at {inflight[0]}")
+            inflight[1].cancel()
+
+    async def _fetch(self, job: ReviewJob) -> Optional[ReviewJob]:
+        if job.source == "github":
+            # Pick up whatever head was pushed while the job sat in the queue
+            job.head_sha = await self.coalescer.begin(job.repo, job.pr_id) or job.head_sha
+            self._cancel_stale_analysis(job)
+
+        # Broadcast START
+        self._log(job, f"Picked up {job.source.upper()} job for {job.repo}")
+
+        # Fetch Code (GitHub or Manual)
+        if job.source == "manual":
+            job.diff_text = job.payload.get("code", "")
+            logger.info("Processing manual code review request.")
+        else:
+            logger.info(f"Analyzing PR #{job.pr_id} in {job.repo}...")
+            # Fetch errors propagate so the job is retried
+            pr_diff = await self._fetch_pr_diff(job)
+            job.diff_text, job.skipped_files = pr_diff.text, pr_diff.skipped
+
+        if not job.diff_text:
+            logger.info("No relevant code changes found.")
+            self._log(job, "No code changes found to analyze.")
+            return None
+
+        if self.triage is not None and job.source == "github":
+            triaged = self.triage.apply(job.diff_text)
+            job.diff_text = triaged.text
+            job.skipped_files.extend(triaged.dropped)
+            if not job.diff_text:
+                # Nothing worth a model call: settle the review here
+                logger.info(f"PR #{job.pr_id} in {job.repo} has only trivial changes.")
+                job.review = LGTM
+
+        return job
+
+    async def _fetch_pr_diff(self, job: ReviewJob) -> PRDiff:
+        """
+        Returns the diff to review for a PR job: only the commits pushed since
+        the last reviewed head when possible, the full PR diff otherwise.
+        """
+        if self.settings.INCREMENTAL_REVIEW_ENABLED and job.head_sha:
+            last_sha = await self.review_state.get_last_reviewed(job.repo, job.pr_id)
+            if last_sha == job.head_sha:
+                logger.info(f"PR #{job.pr_id} in {job.repo} already reviewed at {job.head_sha}.")
+                return PRDiff()
+            if last_sha:
+                diff = await self.github_service.get_compare_diff(job.repo, last_sha, job.head_sha)
+                if diff is not None:
+                    logger.info(f"Reviewing PR #{job.pr_id} incrementally since {last_sha[:7]}")
+                    job.base_sha = last_sha
+                    return diff
+                logger.info(f"PR #{job.pr_id} history was rewritten; reviewing full diff.")
+
+        return await self.github_service.get_pr_diff(job.repo, job.pr_id)
+
+    async def _analyze(self, job: ReviewJob) -> Optional[ReviewJob]:
+        if await self._is_superseded(job):
+            return None
+        if job.review:
+            return job  # Settled by triage
+
+        # Broadcast ANALYZING
+        self._log(job, "Analyzing code logic...")
+
+        # AI Review
+        task = asyncio.create_task(self._run_review(job))
+        if job.source == "github":
+            self._inflight[job.pr_key] = (job.head_sha, task)
+        try:
+            job.review = await task
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                task.cancel()
+                raise
+            # Only the LLM call was cancelled: a newer head superseded it
+            return None
+        finally:
+            if self._inflight.get(job.pr_key, (None, None))[1] is task:
+                del self._inflight[job.pr_key]
+        return job if job.review else None
+
+    async def _run_review(self, job: ReviewJob) -> str:
+        if not self.settings.LLM_STREAMING_ENABLED:
+            return await self.reviewer.analyze_code(job.diff_text, usage=job.tokens)
+
+        # Stream partial output to dashboards; the full text is still returned for posting
+        async with ReviewStreamPublisher(
+            self.events,
+            job.job_id,
+            job.repo,
+            job.pr_id,
+            interval=self.settings.STREAM_FLUSH_INTERVAL,
+            max_chars=self.settings.STREAM_FLUSH_CHARS,
+        ) as stream:
+            return await self.reviewer.analyze_code(job.diff_text, on_delta=stream.write, usage=job.tokens)
+
+    async def _post(self, job: ReviewJob) -> Optional[ReviewJob]:
+        start = time.perf_counter()
+        if await self._is_superseded(job):
+            return None
+
+        formatted_msg = self._format_comment(job)
+
+        # Handle Output (Post to GitHub OR just Log)
+        if job.source == "github":
+            await self.github_service.post_comment(job.repo, job.pr_id, formatted_msg)
+            logger.info(f"Posted review for PR #{job.pr_id}")
+            if job.head_sha:
+                await self.review_state.set_last_reviewed(job.repo, job.pr_id, job.head_sha)
+
+        # Broadcast SUCCESS (Payload includes the full review for Frontend)
+        self.events.publish(SuccessEvent(
+            job.job_id,
+            job.repo,
+            pr=job.pr_id,
+            message="Analysis Complete!",
+            review=job.review,  # Frontend can optionally display this
+        ))
+        job.timings["post"] = time.perf_counter() - start
+        await self._record_history(job)
+        return job
+
+    async def _record_history(self, job: ReviewJob):
+        if self.history is None:
+            return
+        finished_at = time.time()
+        queued_at = job.payload.get("queued_at")
+        try:
+            await self.history.record({
+                "job_id": job.job_id,
+                "repo": job.repo,
+                "pr": job.pr_id,
+                "source": job.source,
+                "head_sha": job.head_sha,
+                "base_sha": job.base_sha,
+                "attempt": job.attempt,
+                "queued_at": queued_at,
+                "dequeued_at": job.dequeued_at,
+                "finished_at": finished_at,
+                "timings": {
+                    **({"queue": job.dequeued_at - queued_at} if queued_at else {}),
+                    **job.timings,
+                    "total": finished_at - (queued_at or job.dequeued_at),
+                },
+                "tokens": job.tokens,
+                "skipped_files": job.skipped_files,
+                "review": job.review,
+            })
+        except Exception as e:
+            # History is best effort; the review itself was delivered
+            logger.warning(f"Failed to record review history for job {job.job_id}: {e}")
+
+    @staticmethod
+    def _format_comment(job: ReviewJob) -> str:
+        parts = ["## GitSentinel Review"]
+        if job.base_sha and job.head_sha:
+            parts.append(f"_Changes since `{job.base_sha[:7]}` (up to `{job.head_sha[:7]}`)_")
+        parts.append(job.review)
+        if job.skipped_files:
+            skipped = "\n".join(f"- `{name}`: {reason}" for name, reason in job.skipped_files)
+            parts.append(f"<details><summary>Not reviewed</summary>\n\n{skipped}\n</details>")
+        return "\n\n".join(parts)
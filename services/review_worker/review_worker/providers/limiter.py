@@ -0,0 +1,235 @@
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from openai import APITimeoutError, RateLimitError
+from redis import asyncio as aioredis
+from review_worker.config import Settings
+from review_worker.services.diff import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Refills and debits a requests bucket and a tokens bucket in one step.
+# Returns 0 if both had room (and debits them), else the ms to wait.
+_TOKEN_BUCKET_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local function level(key, rate, cap)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or cap
+    local ts = tonumber(state[2]) or now
+    return math.min(cap, tokens + (now - ts) * rate)
+end
+
+local req_rate, req_cap = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tok_rate, tok_cap = tonumber(ARGV[3]), tonumber(ARGV[4])
+local tok_cost = math.min(tonumber(ARGV[5]), tok_cap)
+
+local requests = level(KEYS[1], req_rate, req_cap)
+local tokens = level(KEYS[2], tok_rate, tok_cap)
+
+local wait = 0
+if requests < 1 then wait = math.max(wait, (1 - requests) / req_rate) end
+if tokens < tok_cost then wait = math.max(wait, (tok_cost - tokens) / tok_rate) end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - tok_cost
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(requests), 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+return math.ceil(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared by every
+    worker through Redis. Fails open if Redis is unavailable.
+    """
+
+    def __init__(self, redis: aioredis.Redis, name: str, requests_per_minute: int, tokens_per_minute: int):
+        # Hash tag keeps both buckets in one cluster slot, as the script touches both
+        self.keys = [f"sentinel:llm_bucket:{{{name}}}:requests", f"sentinel:llm_bucket:{{{name}}}:tokens"]
+        self.args = [
+            requests_per_minute / 60_000, requests_per_minute,
+            tokens_per_minute / 60_000, tokens_per_minute,
+        ]
+        self._script = redis.register_script(_TOKEN_BUCKET_LUA)
+
+    async def acquire(self, tokens: int):
+        """Waits until one request and `tokens` tokens are available, then takes them."""
+        while True:
+            try:
+                wait_ms = await self._script(keys=self.keys, args=[*self.args, tokens])
+            except Exception as e:
+                logger.warning(f"LLM rate limiter unavailable, continuing without it: {e}")
+                return
+            if wait_ms <= 0:
+                return
+            # Jitter so waiting workers don't all retry at the same instant
+            await asyncio.sleep(min(wait_ms / 1000, 5.0) * random.uniform(1.0, 1.2))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit for calls to the LLM provider.
+    The limit grows by ~1 per window of healthy calls and halves on a 429,
+    a timeout, or a call slower than the latency target.
+    """
+
+    DECREASE_COOLDOWN = 5.0  # Seconds; one overload burst halves the limit once
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self._decrease(f"latency {latency:.1f}s")
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_overload(self, reason: str):
+        self._decrease(reason)
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit / 2)
+        logger.warning(f"LLM overloaded ({reason}); concurrency limit now {int(self.limit)}")
+
+
+class RateLimitedLLM(Runnable):
+    """
+    Runnable wrapper that puts any LLM strategy's model behind the cluster
+    token bucket and the adaptive concurrency limit. Drop-in for the
+    wrapped model in `prompt | llm` chains.
+
+    The wrapped client runs without retries of its own, so every 429 and
+    timeout is seen here; they are retried up to `retries` times (streams
+    only before their first chunk), each time through the limiter again.
+    """
+
+    def __init__(
+        self,
+        llm: Runnable,
+        bucket: RedisTokenBucket,
+        concurrency: AdaptiveConcurrencyLimiter,
+        max_completion_tokens: int,
+        retries: int = 2,
+    ):
+        self.llm = llm
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.max_completion_tokens = max_completion_tokens
+        self.retries = max(0, retries)
+
+    @staticmethod
+    async def _backoff(attempt: int, error: Exception):
+        delay = min(30.0, 2.0 ** attempt) * random.uniform(0.5, 1.0)
+        logger.info(f"Retrying LLM call in {delay:.1f}s after {type(error).__name__}")
+        await asyncio.sleep(delay)
+
+    def _estimate(self, input: Any) -> int:
+        text = input.to_string() if hasattr(input, "to_string") else str(input)
+        # Providers count the completion allowance against the token limit too
+        return estimate_tokens(text) + self.max_completion_tokens
+
+    @asynccontextmanager
+    async def _guard(self, input: Any):
+        await self.bucket.acquire(self._estimate(input))
+        async with self.concurrency.slot():
+            start = time.monotonic()
+            try:
+                yield start
+            except RateLimitError:
+                self.concurrency.on_overload("429 from provider")
+                raise
+            except (APITimeoutError, asyncio.TimeoutError):
+                self.concurrency.on_overload("timeout")
+                raise
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # The worker is fully async; sync calls bypass the limiter
+        return self.llm.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        attempt = 0
+        while True:
+            try:
+                async with self._guard(input) as start:
+                    result = await self.llm.ainvoke(input, config, **kwargs)
+                    self.concurrency.on_success(time.monotonic() - start)
+                    return result
+            except (RateLimitError, APITimeoutError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                await self._backoff(attempt, e)
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        attempt = 0
+        first = True
+        while True:
+            try:
+                async with self._guard(input) as start:
+                    async for chunk in self.llm.astream(input, config, **kwargs):
+                        if first:
+                            # Time to first token is the health signal while streaming
+                            self.concurrency.on_success(time.monotonic() - start)
+                            first = False
+                        yield chunk
+                return
+            except (RateLimitError, APITimeoutError, asyncio.TimeoutError) as e:
+                # Once output has been yielded a retry would repeat it
+                if not first or attempt >= self.retries:
+                    raise
+                attempt += 1
+                await self._backoff(attempt, e)
+
+
+def wrap_with_limiter(
+    llm: Runnable, redis: aioredis.Redis, settings: Settings, name: Optional[str] = None
+) -> RateLimitedLLM:
+    name = name or f"{settings.LLM_MODEL_PROVIDER.lower()}:{settings.LLM_MODEL_NAME}"
+    return RateLimitedLLM(
+        llm,
+        RedisTokenBucket(redis, name, settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE),
+        AdaptiveConcurrencyLimiter(
+            initial=settings.LLM_MAX_CONCURRENCY,
+            minimum=settings.LLM_ADAPTIVE_MIN_CONCURRENCY,
+            maximum=settings.LLM_ADAPTIVE_MAX_CONCURRENCY,
+            latency_target=settings.LLM_LATENCY_TARGET,
+        ),
+        settings.LLM_MAX_TOKENS,
+        retries=settings.LLM_OVERLOAD_RETRIES,
+    )
@@ -1,8 +1,12 @@
-from typing import Dict, Type
+from typing import Dict, Optional, Type
 
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
+from redis import asyncio as aioredis
 from review_worker.config import Settings
 from review_worker.interfaces import LLMStrategy
+from review_worker.providers.limiter import wrap_with_limiter
+from review_worker.providers.pool import LLMPool, PoolMember, endpoint_settings
 
 _LLM_REGISTRY: Dict[str, Type[LLMStrategy]] = {}
 
@@ -13,13 +17,19 @@ def register_llm_strategy(name: str):
         return cls
     return decorator
 
+def _client_retries(settings: Settings) -> int:
+    # Behind the limiter, 429s and timeouts must reach it (and it retries them); otherwise keep the client default
+    return 0 if settings.LLM_RATE_LIMIT_ENABLED else 2
+
 @register_llm_strategy("openai")
 class OpenAIStrategy(LLMStrategy):
     def create_llm(self, settings: Settings) -> ChatOpenAI:
         return ChatOpenAI(
             api_key=lambda: settings.LLM_API_KEY,
             model=settings.LLM_MODEL_NAME,
-            temperature=settings.LLM_TEMPERATURE
+            temperature=settings.LLM_TEMPERATURE,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            max_retries=_client_retries(settings),
         )
 
 @register_llm_strategy("local")
@@ -29,16 +39,38 @@ class LocalStrategy(LLMStrategy):
             base_url=settings.LLM_BASE_URL,
             api_key=lambda: "type-anything",
             model=settings.LLM_MODEL_NAME,
-            temperature=settings.LLM_TEMPERATURE
+            temperature=settings.LLM_TEMPERATURE,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            max_retries=_client_retries(settings),
         )
 
+@register_llm_strategy("pool")
+class PoolStrategy(LLMStrategy):
+    """Several endpoints from LLM_POOL behind one hedging, failover-aware Runnable."""
+    def create_llm(self, settings: Settings) -> LLMPool:
+        members = []
+        for i, endpoint in enumerate(settings.LLM_POOL):
+            member_settings = endpoint_settings(settings, endpoint)
+            provider = member_settings.LLM_MODEL_PROVIDER.lower()
+            strategy_cls = _LLM_REGISTRY.get(provider)
+            if not strategy_cls or strategy_cls is PoolStrategy:
+                raise ValueError(f"Invalid provider for LLM_POOL endpoint {i}: {provider}")
+            members.append(PoolMember(
+                name=endpoint.get("name") or f"{provider}-{i}",
+                llm=strategy_cls().create_llm(member_settings),
+                weight=float(endpoint.get("weight", 1.0)),
+                settings=member_settings,
+            ))
+        return LLMPool(members, settings)
+
 class LLMFactory:
     """
     Factory to retrieve LLM strategies.
     Decoupled from concrete implementations via the _LLM_REGISTRY.
+    Given a Redis client, the model is wrapped in the cluster-wide rate limiter.
     """
     @staticmethod
-    def get_llm(settings: Settings) -> ChatOpenAI:
+    def get_llm(settings: Settings, redis: Optional[aioredis.Redis] = None) -> Runnable:
         provider = settings.LLM_MODEL_PROVIDER.lower()
         
         strategy_cls = _LLM_REGISTRY.get(provider)
@@ -47,4 +79,13 @@ class LLMFactory:
             
         # Instantiate and use the strategy
         strategy = strategy_cls()
-        return strategy.create_llm(settings)
\ No newline at end of file
+        llm = strategy.create_llm(settings)
+
+        if redis is not None and settings.LLM_RATE_LIMIT_ENABLED:
+            if isinstance(llm, LLMPool):
+                # Each backend gets its own buckets and concurrency limit
+                for member in llm.members:
+                    member.llm = wrap_with_limiter(member.llm, redis, member.settings, name=f"pool:{member.name}")
+                return llm
+            return wrap_with_limiter(llm, redis, settings)
+        return llm
\ No newline at end of file
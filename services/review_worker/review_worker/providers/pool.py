@@ -0,0 +1,262 @@
+import time
+import random
+import asyncio
+import logging
+import statistics
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from review_worker.config import Settings
+from review_worker.metrics import LLM_BACKEND_CALLS, LLM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latency samples needed before a quantile is trusted
+_MIN_SAMPLES = 10
+
+# Short keys accepted in LLM_POOL entries -> the Settings field they override
+_ENDPOINT_FIELDS = {
+    "provider": "LLM_MODEL_PROVIDER",
+    "model": "LLM_MODEL_NAME",
+    "base_url": "LLM_BASE_URL",
+    "api_key": "LLM_API_KEY",
+    "temperature": "LLM_TEMPERATURE",
+    "max_tokens": "LLM_MAX_TOKENS",
+    "requests_per_minute": "LLM_REQUESTS_PER_MINUTE",
+    "tokens_per_minute": "LLM_TOKENS_PER_MINUTE",
+    "max_concurrency": "LLM_MAX_CONCURRENCY",
+}
+
+
+def endpoint_settings(settings: Settings, endpoint: Dict[str, Any]) -> Settings:
+    """Settings for one pool endpoint: the worker's settings with the endpoint's overrides."""
+    update = {field: endpoint[key] for key, field in _ENDPOINT_FIELDS.items() if key in endpoint}
+    return settings.model_copy(update=update)
+
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if len(values) < _MIN_SAMPLES:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class BackendStats:
+    """Recent latency samples and failure history of one backend."""
+
+    def __init__(self, window: int = 200):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.error_rate = 0.0  # EWMA of failures
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.error_rate *= 0.9
+        self.consecutive_failures = 0
+
+    def record_failure(self, eject_after: int, eject_seconds: float) -> bool:
+        """Returns True if this failure took the backend out of rotation."""
+        self.error_rate = 0.9 * self.error_rate + 0.1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= eject_after:
+            self.consecutive_failures = 0
+            self.ejected_until = time.monotonic() + eject_seconds
+            return True
+        return False
+
+    def quantile(self, q: float) -> Optional[float]:
+        return _quantile(list(self.latencies), q)
+
+    @property
+    def typical_latency(self) -> float:
+        # Unmeasured backends look instant, so they get tried
+        return statistics.median(self.latencies) if self.latencies else 0.0
+
+
+class PoolMember:
+    def __init__(self, name: str, llm: Runnable, weight: float, settings: Settings):
+        self.name = name
+        self.llm = llm
+        self.weight = max(weight, 1e-3)
+        self.settings = settings
+        self.stats = BackendStats()
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.stats.ejected_until
+
+    @property
+    def score(self) -> float:
+        """Lower is better: typical latency, penalised by recent errors, scaled by weight."""
+        return self.stats.typical_latency * (1 + 10 * self.stats.error_rate) / self.weight
+
+
+class LLMPool(Runnable):
+    """
+    Runnable over several LLM backends (LLM_POOL).
+
+    Each call goes to the best-scoring healthy backend (latency and error
+    rate, scaled by weight). If it has not answered by its own latency
+    quantile (LLM_HEDGE_QUANTILE, at least LLM_HEDGE_MIN_DELAY), the call is
+    hedged to the next backend and the first answer wins; the loser is
+    cancelled. A backend without enough samples uses the quantile of the
+    whole pool, or LLM_HEDGE_INITIAL_DELAY (capped at LLM_LATENCY_TARGET)
+    while the pool has none either. Errors fail over to the next backend right away. A backend
+    that fails (or loses a hedge) LLM_POOL_EJECT_FAILURES times in a row is
+    left out for LLM_POOL_EJECT_SECONDS. For streams, the race is to the
+    first chunk.
+    """
+
+    def __init__(self, members: List[PoolMember], settings: Settings):
+        if not members:
+            raise ValueError("LLM_POOL has no endpoints")
+        self.members = members
+        self.settings = settings
+
+    def _ranked(self) -> List[PoolMember]:
+        healthy = [m for m in self.members if m.healthy] or list(self.members)
+        # Random tie-break so equal backends share load
+        return sorted(healthy, key=lambda m: (m.score, random.random() / m.weight))
+
+    def _hedge_delay(self, member: PoolMember) -> float:
+        q = self.settings.LLM_HEDGE_QUANTILE
+        observed = member.stats.quantile(q)
+        if observed is None:
+            observed = _quantile([latency for m in self.members for latency in m.stats.latencies], q)
+        if observed is None:
+            observed = min(self.settings.LLM_HEDGE_INITIAL_DELAY, self.settings.LLM_LATENCY_TARGET)
+        return max(self.settings.LLM_HEDGE_MIN_DELAY, observed)
+
+    def _failed(self, member: PoolMember, reason: str):
+        LLM_BACKEND_CALLS.labels(member.name, reason).inc()
+        ejected = member.stats.record_failure(
+            self.settings.LLM_POOL_EJECT_FAILURES, self.settings.LLM_POOL_EJECT_SECONDS
+        )
+        if ejected:
+            logger.warning(f"LLM backend {member.name} ejected for {self.settings.LLM_POOL_EJECT_SECONDS:.0f}s")
+
+    async def _attempt(self, member: PoolMember, call: Callable[[PoolMember], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        try:
+            result = await call(member)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._failed(member, "error")
+            raise
+        member.stats.record_success(time.monotonic() - start)
+        LLM_BACKEND_CALLS.labels(member.name, "success").inc()
+        return result
+
+    async def _race(
+        self,
+        call: Callable[[PoolMember], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[Any]]] = None,
+    ) -> Tuple[PoolMember, T]:
+        """
+        Runs `call` on the best backend, hedging and failing over as needed.
+        `discard` releases a successful result that lost the race (e.g. an
+        opened stream); several attempts can finish in the same instant.
+        """
+        candidates = self._ranked()
+        pending: Dict[asyncio.Task, PoolMember] = {}
+        loop = asyncio.get_running_loop()
+        hedge_at: Optional[float] = None
+        hedged_against: Optional[PoolMember] = None
+        last_error: Optional[BaseException] = None
+
+        def launch() -> PoolMember:
+            member = candidates.pop(0)
+            pending[asyncio.create_task(self._attempt(member, call))] = member
+            return member
+
+        first = launch()
+        if self.settings.LLM_HEDGE_ENABLED:
+            hedge_at = loop.time() + self._hedge_delay(first)
+
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None and candidates:
+                    timeout = max(0.0, hedge_at - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # The primary is slower than usual: race a second backend
+                    hedged_against, hedge_at = first, None
+                    backup = launch()
+                    LLM_HEDGES.labels(backup.name).inc()
+                    logger.info(f"Hedging LLM call from {first.name} to {backup.name}")
+                    continue
+
+                winner: Optional[Tuple[PoolMember, T]] = None
+                for task in done:
+                    member = pending.pop(task)
+                    if task.exception() is None:
+                        if winner is None:
+                            winner = member, task.result()
+                        elif discard is not None:
+                            await discard(task.result())
+                        continue
+                    last_error = task.exception()
+                    logger.warning(f"LLM backend {member.name} failed: {last_error}")
+                if winner is not None:
+                    if hedged_against is not None and hedged_against in pending.values():
+                        # Still running after losing the hedge: counts against its health
+                        self._failed(hedged_against, "slow")
+                    return winner
+
+                if not pending and candidates:
+                    # Fail over; the new primary gets its own hedge deadline
+                    first = launch()
+                    if self.settings.LLM_HEDGE_ENABLED and hedged_against is None:
+                        hedge_at = loop.time() + self._hedge_delay(first)
+
+            assert last_error is not None
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            if discard is not None:
+                # An attempt can finish after losing, before its cancellation lands
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # The worker is fully async; sync calls go to the best backend without hedging
+        return self._ranked()[0].llm.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        _, result = await self._race(lambda member: member.llm.ainvoke(input, config, **kwargs))
+        return result
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        async def open_stream(member: PoolMember):
+            stream = member.llm.astream(input, config, **kwargs).__aiter__()
+            try:
+                return stream, await stream.__anext__()
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def close_stream(opened: Tuple[Any, Any]):
+            await opened[0].aclose()
+
+        member, (stream, first) = await self._race(open_stream, discard=close_stream)
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            self._failed(member, "error")
+            raise
+        finally:
+            await stream.aclose()
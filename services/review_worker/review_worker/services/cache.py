@@ -0,0 +1,92 @@
+import time
+import hashlib
+import logging
+from typing import List, Optional
+from redis import asyncio as aioredis
+from review_worker.config import Settings
+from review_worker.metrics import REVIEW_CACHE
+from review_worker.services.diff import normalize_patch
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewCache:
+    """
+    Content-addressed cache of per-file review findings in Redis.
+
+    Entries are keyed by a hash of the normalized patch, the model name and
+    the prompt version, so a file whose patch did not change between pushes
+    (or an identical manual resubmission) reuses its earlier findings.
+    Entries expire after REVIEW_CACHE_TTL seconds; beyond
+    REVIEW_CACHE_MAX_ENTRIES the least recently used ones are evicted.
+    """
+
+    PREFIX = "sentinel:review_cache"
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings, prompt_version: str):
+        self.redis = redis
+        self.ttl = settings.REVIEW_CACHE_TTL
+        self.max_entries = settings.REVIEW_CACHE_MAX_ENTRIES
+        self.namespace = f"{settings.LLM_MODEL_NAME}:{prompt_version}"
+        self.index_key = f"{self.PREFIX}:lru"
+        self.stats_key = f"{self.PREFIX}:stats"
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, patch: str) -> str:
+        digest = hashlib.sha256(
+            f"{self.namespace}\0{normalize_patch(patch)}".encode("utf-8")
+        ).hexdigest()
+        return f"{self.PREFIX}:{digest}"
+
+    async def get_many(self, patches: List[str]) -> List[Optional[str]]:
+        """Looks up findings for each patch; refreshes TTL and recency of hits."""
+        if not patches:
+            return []
+        keys = [self.key_for(p) for p in patches]
+        now = time.time()
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.getex(key, ex=self.ttl)
+            values = await pipe.execute()
+
+        hit_keys = {key: now for key, value in zip(keys, values) if value is not None}
+        hits = len(hit_keys)
+        misses = len(keys) - hits
+        self.hits += hits
+        self.misses += misses
+        REVIEW_CACHE.labels("hit").inc(hits)
+        REVIEW_CACHE.labels("miss").inc(misses)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if hit_keys:
+                pipe.zadd(self.index_key, hit_keys)
+            pipe.hincrby(self.stats_key, "hits", hits)
+            pipe.hincrby(self.stats_key, "misses", misses)
+            await pipe.execute()
+
+        return values
+
+    async def set(self, patch: str, findings: str):
+        key = self.key_for(patch)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, findings, ex=self.ttl)
+            pipe.zadd(self.index_key, {key: time.time()})
+            pipe.zcard(self.index_key)
+            _, _, size = await pipe.execute()
+
+        if size > self.max_entries:
+            await self._evict(size - self.max_entries)
+
+    async def _evict(self, count: int):
+        oldest = await self.redis.zpopmin(self.index_key, count)
+        keys = [key for key, _ in oldest]
+        if keys:
+            await self.redis.delete(*keys)
+            logger.debug(f"Evicted {len(keys)} review cache entries")
+
+    async def stats(self) -> dict:
+        """Cluster-wide hit/miss counters."""
+        raw = await self.redis.hgetall(self.stats_key)  # type: ignore
+        return {"hits": int(raw.get("hits", 0)), "misses": int(raw.get("misses", 0))}
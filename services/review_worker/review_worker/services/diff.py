@@ -0,0 +1,116 @@
+import re
+from typing import List, Optional, Tuple
+
+# Marker placed before each file's patch in the diff text built by GitHubService
+FILE_HEADER = "\n--- File: {filename} ---\n"
+_FILE_HEADER_RE = re.compile(r"^--- File: (.+) ---$", re.MULTILINE)
+_HUNK_HEADER_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@", re.MULTILINE)
+
+
+def format_file_header(filename: str) -> str:
+    return FILE_HEADER.format(filename=filename)
+
+
+def split_diff_by_file(diff: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Splits a diff into (filename, patch) pairs.
+    Text without file markers (e.g. manual submissions) is returned as a
+    single entry with no filename.
+    """
+    matches = list(_FILE_HEADER_RE.finditer(diff))
+    if not matches:
+        return [(None, diff)] if diff.strip() else []
+
+    files = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(diff)
+        patch = diff[match.end():end].strip("\n")
+        if patch:
+            files.append((match.group(1), patch))
+    return files
+
+
+def normalize_patch(patch: str) -> str:
+    """
+    Canonical form of a patch for content addressing: line endings and
+    trailing whitespace are unified and hunk line numbers are dropped, so
+    the same change at a shifted offset normalizes identically.
+    """
+    text = patch.replace("\r\n", "\n")
+    text = _HUNK_HEADER_RE.sub("@@", text)
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip("\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, tokenizer-free token estimate. Source code averages a little over
+    three characters per token on common BPE vocabularies, so this errs on
+    the side of smaller chunks.
+    """
+    return len(text) // 3 + 1
+
+
+def split_hunks(patch: str) -> List[str]:
+    """Splits a file patch at its '@@' hunk headers."""
+    hunks: List[str] = []
+    current: List[str] = []
+    for line in patch.split("\n"):
+        if line.startswith("@@") and current:
+            hunks.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        hunks.append("\n".join(current))
+    return hunks
+
+
+def _split_lines(hunk: str, budget: int) -> List[str]:
+    """Splits one oversized hunk on line boundaries, repeating its header."""
+    lines = hunk.split("\n")
+    header = lines[0] if lines[0].startswith("@@") else ""
+    body = lines[1:] if header else lines
+
+    pieces: List[str] = []
+    current: List[str] = [header] if header else []
+    size = estimate_tokens(header)
+    for line in body:
+        cost = estimate_tokens(line)
+        if size + cost > budget and len(current) > (1 if header else 0):
+            pieces.append("\n".join(current))
+            current = [header] if header else []
+            size = estimate_tokens(header)
+        current.append(line)
+        size += cost
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_patch(patch: str, budget: int) -> List[str]:
+    """
+    Splits a single file's patch into pieces of at most ~`budget` tokens.
+    Whole hunks are kept together where possible; only a hunk that is larger
+    than the budget on its own is split on line boundaries.
+    """
+    if estimate_tokens(patch) <= budget:
+        return [patch]
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for hunk in split_hunks(patch):
+        cost = estimate_tokens(hunk)
+        if cost > budget:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.extend(_split_lines(hunk, budget))
+            continue
+        if size + cost > budget and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(hunk)
+        size += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -1,53 +1,363 @@
+import time
+import random
+import hashlib
 import logging
+import importlib.util
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Iterator, List, MutableMapping, Optional, Tuple
 import httpx
+from gidgethub import HTTPException as GitHubHTTPException, RateLimitExceeded
 from gidgethub.httpx import GitHubAPI
+from gidgethub.sansio import RateLimit
+from redis import asyncio as aioredis
 from review_worker.config import Settings
+from review_worker.services.diff import format_file_header
+from review_worker.services.triage import PathRules
 
 logger = logging.getLogger(__name__)
 
+# Collects the rate limit of each response made by the current task (see _TrackingGitHubAPI)
+_response_rate_limit: ContextVar[Optional[List[RateLimit]]] = ContextVar("github_response_rate_limit", default=None)
+
+
+class ResponseCache(MutableMapping[str, Any]):
+    """
+    Bounded LRU mapping handed to gidgethub as its response cache.
+    gidgethub stores the ETag / Last-Modified of each GET here, sends them
+    back as If-None-Match / If-Modified-Since, and serves 304s from it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __delitem__(self, key: str):
+        del self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _TrackingGitHubAPI(GitHubAPI):
+    """
+    GitHubAPI that hands the rate limit of every response to the task that
+    made the request. The client's own `rate_limit` attribute is shared by
+    all concurrent calls, so reading it afterwards races.
+    """
+
+    async def _request(self, method: str, url: str, headers: MutableMapping[str, str], body: bytes = b""):
+        response = await super()._request(method, url, headers, body)
+        box = _response_rate_limit.get()
+        if box is not None:
+            rate_limit = RateLimit.from_http(response[1])
+            if rate_limit is not None:
+                box[:] = [rate_limit]
+        return response
+
+
+class GitHubThrottled(Exception):
+    """Raised instead of calling GitHub while the credential in use is out of quota."""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"GitHub quota exhausted for {key}, retry in {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class RateLimitScheduler:
+    """
+    Tracks GitHub quota per credential, shared by all workers via Redis.
+
+    GitHub counts requests against the token that makes them, so that is
+    the key. After every call the X-RateLimit-Remaining / Reset values of
+    its response are stored; once fewer than GITHUB_RATE_LIMIT_RESERVE
+    calls remain, further calls with the token are refused with
+    GitHubThrottled until the reset. Secondary (abuse) limits put the token
+    into an exponential backoff with jitter.
+    """
+
+    PREFIX = "sentinel:gh_ratelimit"
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.reserve = settings.GITHUB_RATE_LIMIT_RESERVE
+        self.backoff_base = settings.GITHUB_SECONDARY_BACKOFF_BASE
+        self.backoff_max = settings.GITHUB_SECONDARY_BACKOFF_MAX
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        # A digest, so the credential itself never lands in Redis
+        return f"token:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]}" if token else "anonymous"
+
+    async def delay_for(self, key: str) -> float:
+        """Seconds until `key` may call GitHub again (0 if it may now)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(f"{self.PREFIX}:{key}", "remaining", "reset")
+            pipe.pttl(f"{self.PREFIX}:backoff:{key}")
+            (remaining, reset), backoff_ms = await pipe.execute()
+
+        delay = max(0.0, backoff_ms / 1000) if backoff_ms and backoff_ms > 0 else 0.0
+        if remaining is not None and reset is not None and int(remaining) <= self.reserve:
+            delay = max(delay, float(reset) - time.time())
+        return delay
+
+    async def record(self, key: str, rate_limit: Optional[RateLimit]):
+        if rate_limit is None:
+            return
+        reset = rate_limit.reset_datetime.timestamp()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(f"{self.PREFIX}:{key}", mapping={"remaining": rate_limit.remaining, "reset": reset})
+            pipe.expireat(f"{self.PREFIX}:{key}", int(reset) + 1)
+            await pipe.execute()
+
+    async def backoff(self, key: str) -> float:
+        """Starts (or extends) a secondary-limit backoff and returns its length."""
+        attempt = await self.redis.incr(f"{self.PREFIX}:backoff_n:{key}")
+        await self.redis.expire(f"{self.PREFIX}:backoff_n:{key}", int(self.backoff_max * 4))
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay *= random.uniform(0.5, 1.0)
+        await self.redis.set(f"{self.PREFIX}:backoff:{key}", 1, px=int(delay * 1000))
+        return delay
+
+
+@dataclass
+class PRDiff:
+    """Diff text to review plus the files that were left out of it, with why."""
+    text: str = ""
+    skipped: List[Tuple[str, str]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+
+class DiffBuilder:
+    """
+    Assembles a diff from GitHub file entries in linear time while keeping
+    it within a per-file and a total byte budget.
+    """
+
+    def __init__(self, max_file_bytes: int, max_total_bytes: int, accept: Callable[[str], bool]):
+        self.max_file_bytes = max_file_bytes
+        self.accept = accept  # Path filter (REVIEW_INCLUDE_PATHS / REVIEW_EXCLUDE_PATHS)
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.parts: List[str] = []
+        self.skipped: List[Tuple[str, str]] = []
+
+    def add(self, file: dict) -> bool:
+        """Adds one file entry. Returns False once the total budget is spent."""
+        filename = file.get("filename", "")
+        status = file.get("status", "")
+        patch = file.get("patch")
+
+        if status == "removed" or not self.accept(filename):
+            return True
+
+        if patch is None:
+            # GitHub omits the patch of very large (or binary) files
+            if file.get("changes", 0):
+                self.skipped.append((filename, "diff too large for the GitHub API"))
+            return True
+
+        size = len(patch.encode("utf-8"))
+        if size > self.max_file_bytes:
+            self.skipped.append((filename, f"patch is {size // 1024} KB, over the per-file limit"))
+            return True
+
+        if self.total_bytes + size > self.max_total_bytes:
+            self.skipped.append((filename, "total diff size limit reached"))
+            return False
+
+        self.parts.append(format_file_header(filename))
+        self.parts.append(patch)
+        self.total_bytes += size
+        return True
+
+    def truncate(self, remaining: Optional[int] = None):
+        """
+        Notes that paging stopped at the budget, so the comment does not
+        suggest the files after the one that hit it were reviewed.
+        `remaining` is their count, when known.
+        """
+        name = f"{remaining} remaining file(s)" if remaining is not None else "remaining files"
+        if remaining != 0:
+            self.skipped.append((name, "not fetched (diff size limit)"))
+
+    def build(self) -> PRDiff:
+        return PRDiff(text="".join(self.parts), skipped=self.skipped)
+
+
 class GitHubService:
-    def __init__(self, settings: Settings):
+    """
+    GitHub REST access for the worker.
+    Holds one pooled, keep-alive HTTP client for the whole process; call
+    `close()` on shutdown. With a Redis client, calls are gated by a
+    RateLimitScheduler on the quota of GITHUB_API_TOKEN (every call uses it,
+    whatever installation the job came from).
+    """
+
+    def __init__(self, settings: Settings, redis: Optional[aioredis.Redis] = None):
         self.token = settings.GITHUB_API_TOKEN
         self.app_name = settings.APP_NAME
-        
-    async def get_pr_diff(self, repo_name: str, pr_number: int) -> str:
+        self.settings = settings
+        self.scheduler = RateLimitScheduler(redis, settings) if redis is not None else None
+        self.quota_key = RateLimitScheduler.key_for(self.token)
+        self.cache = ResponseCache(settings.GITHUB_CACHE_SIZE)
+        self.path_rules = PathRules.from_settings(settings)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._gh: Optional[GitHubAPI] = None
+
+    def _api(self) -> GitHubAPI:
+        """Returns the shared client, creating the connection pool on first use."""
+        if self._gh is None:
+            http2 = importlib.util.find_spec("h2") is not None  # httpx needs the 'h2' extra
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=self.settings.GITHUB_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=self.settings.GITHUB_MAX_CONNECTIONS,
+                    max_keepalive_connections=self.settings.GITHUB_MAX_KEEPALIVE,
+                ),
+            )
+            self._gh = _TrackingGitHubAPI(
+                self._client,
+                self.app_name,
+                oauth_token=self.token,
+                cache=self.cache,
+                base_url=self.settings.GITHUB_API_URL,
+            )
+            logger.info(f"GitHub client pool ready (http2={http2})")
+        return self._gh
+
+    async def close(self):
+        """Closes the pooled HTTP client (if open)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._gh = None
+
+    @asynccontextmanager
+    async def _rate_limited(self):
         """
-        Async fetches the PR files and constructs a diff string.
+        Refuses the call while the token is throttled, records the quota
+        reported by the call's own responses, and turns rate-limit errors
+        into GitHubThrottled so the caller can reschedule instead of failing.
         """
-        async with httpx.AsyncClient() as client:
-            gh = GitHubAPI(client, self.app_name, oauth_token=self.token)
-            
-            # API: GET /repos/{owner}/{repo}/pulls/{pull_number}/files
-            # This returns the list of files with their patches
+        if self.scheduler is None:
+            yield
+            return
+
+        key = self.quota_key
+        delay = await self.scheduler.delay_for(key)
+        if delay > 0:
+            raise GitHubThrottled(key, delay)
+
+        observed: List[RateLimit] = []
+        context_token = _response_rate_limit.set(observed)
+        try:
+            yield
+        except RateLimitExceeded as e:
+            await self.scheduler.record(key, e.rate_limit)
+            raise GitHubThrottled(key, max(1.0, e.rate_limit.reset_datetime.timestamp() - time.time())) from e
+        except GitHubHTTPException as e:
+            if e.status_code in (403, 429) and "secondary rate limit" in str(e).lower():
+                raise GitHubThrottled(key, await self.scheduler.backoff(key)) from e
+            raise
+        finally:
+            _response_rate_limit.reset(context_token)
             try:
-                files = await gh.getitem(f"/repos/{repo_name}/pulls/{pr_number}/files")
+                await self.scheduler.record(key, observed[-1] if observed else None)
             except Exception as e:
-                logger.error(f"Failed to fetch PR files: {e}")
-                return ""
-
-            diff_text = ""
-            for file in files:
-                # Same logic as your PyGithub code
-                filename = file.get("filename", "")
-                status = file.get("status", "")
-                patch = file.get("patch", "")
-
-                if status != "removed" and filename.endswith(".py"):
-                    diff_text += f"\n--- File: {filename} ---\n"
-                    diff_text += patch
-            
-            return diff_text
+                logger.debug(f"Failed to record GitHub rate limit: {e}")
+
+    def _diff_builder(self) -> DiffBuilder:
+        return DiffBuilder(
+            self.settings.GITHUB_MAX_PATCH_BYTES, self.settings.GITHUB_MAX_DIFF_BYTES, self.path_rules.matches
+        )
+
+    async def iter_pr_files(self, repo_name: str, pr_number: int) -> AsyncIterator[dict]:
+        """
+        Async yields the PR's file entries page by page, as they arrive.
+        """
+        gh = self._api()
+
+        # API: GET /repos/{owner}/{repo}/pulls/{pull_number}/files
+        # Paginated (30 per page by default, max 3000 files); getiter follows the Link header
+        async for file in gh.getiter(f"/repos/{repo_name}/pulls/{pr_number}/files{{?per_page}}", {"per_page": 100}):
+            yield file
+
+    async def get_pr_diff(self, repo_name: str, pr_number: int) -> PRDiff:
+        """
+        Async fetches the PR files and constructs a diff.
+        Stops paging once the total byte budget is spent. Errors are raised
+        (not turned into an empty diff) so the job can be retried.
+        """
+        builder = self._diff_builder()
+        async with self._rate_limited():
+            async for file in self.iter_pr_files(repo_name, pr_number):
+                if not builder.add(file):
+                    logger.warning(f"PR #{pr_number} in {repo_name} exceeds the diff budget; truncating.")
+                    builder.truncate()
+                    break
+
+        return builder.build()
+
+    async def get_compare_diff(self, repo_name: str, base_sha: str, head_sha: str) -> Optional[PRDiff]:
+        """
+        Async fetches only the changes between two commits of a PR branch.
+        Returns None when `head_sha` does not build on `base_sha` (e.g. after
+        a force-push), so the caller can fall back to the full PR diff.
+        """
+        gh = self._api()
+
+        # API: GET /repos/{owner}/{repo}/compare/{base}...{head}
+        try:
+            async with self._rate_limited():
+                comparison = await gh.getitem(f"/repos/{repo_name}/compare/{base_sha}...{head_sha}")
+        except GitHubThrottled:
+            raise
+        except Exception as e:
+            logger.info(f"Compare {base_sha[:7]}...{head_sha[:7]} unavailable: {e}")
+            return None
+
+        if comparison.get("status") != "ahead":
+            return None
+
+        builder = self._diff_builder()
+        files = comparison.get("files", [])
+        for i, file in enumerate(files):
+            if not builder.add(file):
+                builder.truncate(len(files) - i - 1)
+                break
+        return builder.build()
 
     async def post_comment(self, repo_name: str, pr_number: int, comment: str):
         """
         Async posts a comment to the PR.
         """
-        async with httpx.AsyncClient() as client:
-            gh = GitHubAPI(client, self.app_name, oauth_token=self.token)
-            
-            # API: POST /repos/{owner}/{repo}/issues/{issue_number}/comments
-            # Note: GitHub PRs are technically "issues" for commenting purposes
+        gh = self._api()
+
+        # API: POST /repos/{owner}/{repo}/issues/{issue_number}/comments
+        # Note: GitHub PRs are technically "issues" for commenting purposes
+        async with self._rate_limited():
             await gh.post(
                 f"/repos/{repo_name}/issues/{pr_number}/comments",
                 data={"body": comment}
-            )
\ No newline at end of file
+            )
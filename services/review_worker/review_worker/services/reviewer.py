@@ -1,16 +1,42 @@
+import re
+import time
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
+from review_worker.metrics import LLM_CALL_SECONDS, LLM_TOKENS
+from review_worker.services.cache import ReviewCache
+from review_worker.services.diff import chunk_patch, estimate_tokens, format_file_header, split_diff_by_file
+from review_worker.services.similarity import SimilarReviewIndex
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt changes so cached findings are not reused
+PROMPT_VERSION = "v1"
+LGTM = "LGTM! 🚀"
+
+# Receives (file label, text delta) as review text is generated
+DeltaCallback = Callable[[str, str], None]
 
 
 class ReviewerAgent:
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(
+        self,
+        llm: Runnable,
+        cache: Optional[ReviewCache] = None,
+        chunk_tokens: int = 1500,
+        max_concurrency: Optional[int] = 4,
+        similar: Optional[SimilarReviewIndex] = None,
+    ):
         self.llm = llm
-
-    async def analyze_code(self, diff: str) -> str:
-        """
-        Uses the LLM to find bugs in the diff.
-        """
-        prompt = ChatPromptTemplate.from_messages(
+        self.cache = cache
+        self.similar = similar
+        self.chunk_tokens = chunk_tokens
+        # None: no local cap, e.g. when the LLM is behind the adaptive limiter
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency)) if max_concurrency else None
+        self.prompt = ChatPromptTemplate.from_messages(
             [
                 (
                     "system",
@@ -28,6 +54,222 @@ class ReviewerAgent:
             ]
         )
 
-        chain = prompt | self.llm
-        result = await chain.ainvoke({"diff": diff})
-        return str(result.content)
+    async def analyze_code(
+        self, diff: str, on_delta: Optional[DeltaCallback] = None, usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """
+        Uses the LLM to find bugs in the diff.
+        Each file is reviewed on its own so unchanged files can be served
+        from the review cache. Misses are then looked up among near-identical
+        patches reviewed before (the similarity index); only what is left
+        reaches the LLM. Reused findings are approximate, so only fresh
+        reviews go into the exact cache. Files larger
+        than the token budget are split into hunk-aligned chunks which are
+        reviewed concurrently and merged back per file.
+        With `on_delta`, the LLM output is streamed to it as it is generated
+        (reused findings are passed in one piece); the full review is still
+        returned at the end.
+        With `usage`, the tokens sent and generated for this diff are added
+        to its "input" and "output" counts.
+        """
+        files = split_diff_by_file(diff)
+        if not files:
+            return ""
+
+        patches = [patch for _, patch in files]
+        cached = await self._cache_lookup(patches)
+
+        missing = [i for i, hit in enumerate(cached) if hit is None]
+        if len(missing) < len(files):
+            logger.info(f"Review cache: {len(files) - len(missing)}/{len(files)} file(s) reused")
+            if on_delta is not None:
+                for (name, _), hit in zip(files, cached):
+                    if hit is not None:
+                        on_delta(name or "", hit)
+
+        findings = list(cached)
+        similar, signatures = await self._similar_lookup([files[i] for i in missing])
+        signature_of = dict(zip(missing, signatures))
+        for i, hit in zip(missing, similar):
+            if hit is not None:
+                findings[i] = hit
+                if on_delta is not None:
+                    on_delta(files[i][0] or "", hit)
+        reused = sum(1 for hit in similar if hit is not None)
+        if reused:
+            logger.info(f"Similarity index: {reused}/{len(missing)} uncached file(s) reused")
+            missing = [i for i in missing if findings[i] is None]
+
+        fresh = await asyncio.gather(
+            *(self._review_file(files[i][0], patches[i], on_delta, usage) for i in missing)
+        )
+        for i, result in zip(missing, fresh):
+            findings[i] = result
+            await self._cache_store(patches[i], result)
+            await self._similar_store(files[i][0], result, signature_of.get(i))
+
+        return self._merge([(name, f or "") for (name, _), f in zip(files, findings)])
+
+    async def _review_file(
+        self,
+        filename: Optional[str],
+        patch: str,
+        on_delta: Optional[DeltaCallback] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        chunks = chunk_patch(patch, self.chunk_tokens)
+        labels = [filename or ""] * len(chunks)
+        if len(chunks) > 1:
+            logger.info(f"Reviewing {filename or 'submission'} in {len(chunks)} chunks")
+            for i, chunk in enumerate(chunks):
+                labels[i] = f"{filename or 'submission'} (part {i + 1}/{len(chunks)})"
+                if filename:
+                    chunks[i] = f"--- File: {filename} (part {i + 1}/{len(chunks)}) ---\n{chunk}"
+        elif filename:
+            # The cache key is the bare patch, but the LLM still needs the filename (and its language)
+            chunks[0] = format_file_header(filename).lstrip("\n") + chunks[0]
+
+        results = await asyncio.gather(*(
+            self._review_patch(chunk, label, on_delta, usage) for chunk, label in zip(chunks, labels)
+        ))
+        return self._reduce(results)
+
+    async def _review_patch(
+        self,
+        patch: str,
+        label: str = "",
+        on_delta: Optional[DeltaCallback] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        async with self._semaphore or nullcontext():
+            chain = self.prompt | self.llm
+            start = time.perf_counter()
+            reported = None
+            if on_delta is None:
+                result = await chain.ainvoke({"diff": patch})
+                text, reported = str(result.content), getattr(result, "usage_metadata", None)
+            else:
+                parts: List[str] = []
+                async for chunk in chain.astream({"diff": patch}):
+                    reported = getattr(chunk, "usage_metadata", None) or reported
+                    delta = chunk.content if isinstance(chunk.content, str) else ""
+                    if delta:
+                        parts.append(delta)
+                        on_delta(label, delta)
+                text = "".join(parts)
+
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start)
+            tokens_in, tokens_out = self._count_tokens(patch, text, reported)
+            if usage is not None:
+                usage["input"] = usage.get("input", 0) + tokens_in
+                usage["output"] = usage.get("output", 0) + tokens_out
+            return text
+
+    @staticmethod
+    def _count_tokens(patch: str, text: str, usage: Optional[dict]) -> Tuple[int, int]:
+        if usage:
+            tokens_in, tokens_out = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            tokens_in, tokens_out = estimate_tokens(patch), estimate_tokens(text)
+        LLM_TOKENS.labels("in").inc(tokens_in)
+        LLM_TOKENS.labels("out").inc(tokens_out)
+        return tokens_in, tokens_out
+
+    async def _cache_lookup(self, patches: List[str]) -> List[Optional[str]]:
+        if self.cache is None:
+            return [None] * len(patches)
+        try:
+            return await self.cache.get_many(patches)
+        except Exception as e:
+            logger.warning(f"Review cache lookup failed: {e}")
+            return [None] * len(patches)
+
+    async def _cache_store(self, patch: str, findings: str):
+        if self.cache is None or not findings:
+            return
+        try:
+            await self.cache.set(patch, findings)
+        except Exception as e:
+            logger.warning(f"Review cache store failed: {e}")
+
+    async def _similar_lookup(
+        self, files: List[Tuple[Optional[str], str]]
+    ) -> Tuple[List[Optional[str]], List[Optional[List[int]]]]:
+        """Reused findings per file, and each patch's signature so a fresh review can be indexed without rehashing."""
+        if self.similar is None or not files:
+            return [None] * len(files), [None] * len(files)
+
+        async def find(filename: Optional[str], patch: str) -> Tuple[Optional[str], Optional[List[int]]]:
+            signature = None
+            try:
+                signature = await self.similar.signature(patch)  # type: ignore[union-attr]
+                match = await self.similar.find(patch, signature)  # type: ignore[union-attr]
+            except Exception as e:
+                logger.warning(f"Similarity lookup failed: {e}")
+                return None, signature
+            return (self.similar.adapt(match, filename or "") if match else None), signature  # type: ignore[union-attr]
+
+        results = await asyncio.gather(*(find(name, patch) for name, patch in files))
+        return [hit for hit, _ in results], [signature for _, signature in results]
+
+    async def _similar_store(self, filename: Optional[str], findings: str, signature: Optional[List[int]]):
+        if self.similar is None or not findings or signature is None:
+            return
+        try:
+            await self.similar.add(filename or "", findings, signature)
+        except Exception as e:
+            logger.warning(f"Similarity index store failed: {e}")
+
+    @staticmethod
+    def _is_lgtm(text: str) -> bool:
+        return text.strip().startswith("LGTM")
+
+    @staticmethod
+    def _paragraphs(text: str) -> List[str]:
+        """Splits findings on blank lines, keeping fenced code blocks whole."""
+        paragraphs: List[str] = []
+        current: List[str] = []
+        in_fence = False
+        for line in text.strip().split("\n"):
+            if line.strip().startswith("```"):
+                in_fence = not in_fence
+            if not line.strip() and not in_fence:
+                if current:
+                    paragraphs.append("\n".join(current))
+                    current = []
+                continue
+            current.append(line)
+        if current:
+            paragraphs.append("\n".join(current))
+        return paragraphs
+
+    @classmethod
+    def _reduce(cls, results: List[str]) -> str:
+        """Merges the findings of a file's chunks, dropping repeated paragraphs."""
+        if len(results) == 1:
+            return results[0]
+
+        seen = set()
+        merged: List[str] = []
+        for text in results:
+            if not text.strip() or cls._is_lgtm(text):
+                continue
+            for paragraph in cls._paragraphs(text):
+                key = re.sub(r"\s+", " ", paragraph).strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(paragraph)
+        return "\n\n".join(merged) if merged else LGTM
+
+    @classmethod
+    def _merge(cls, findings: List[Tuple[Optional[str], str]]) -> str:
+        """Combines per-file findings into one report, leaving out clean files."""
+        if len(findings) == 1:
+            return findings[0][1]
+
+        sections = [
+            f"### `{name}`\n\n{text.strip()}" if name else text.strip()
+            for name, text in findings
+            if text.strip() and not cls._is_lgtm(text)
+        ]
+        return "\n\n".join(sections) if sections else LGTM
@@ -0,0 +1,206 @@
+import re
+import zlib
+import array
+import heapq
+import base64
+import asyncio
+import random
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+from redis import asyncio as aioredis
+from review_worker.config import Settings
+from review_worker.metrics import SIMILARITY, SIMILARITY_SCORE, SIMILARITY_TOKENS_SAVED
+from review_worker.services.diff import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Around a path in text: not inside a longer path or name ('a.py' in 'data.py')
+_PATH_BEFORE = r"(?<![\w./\\-])"
+_PATH_AFTER = r"(?![\w/\\-]|\.\w)"
+
+
+@dataclass
+class SimilarReview:
+    """Findings of an earlier, near-identical patch."""
+    findings: str
+    filename: str
+    score: float
+
+
+class MinHasher:
+    """
+    MinHash signatures over token shingles of a patch's changed lines.
+
+    Only '+' and '-' lines count, re-tokenized, so the same change with
+    different context, offsets or spacing hashes alike. Case is kept: in
+    most languages `Value` and `value` are different names. The
+    permutations come from a fixed seed: every worker computes the same
+    signature for the same patch. Past `max_shingles`, only the shingles
+    with the smallest hashes are kept (the same ones for the same text),
+    which bounds the cost of a huge patch.
+    """
+
+    def __init__(self, num_perm: int, shingle_size: int, max_shingles: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self.max_shingles = max_shingles
+        self.perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1)) for _ in range(num_perm)
+        ]
+
+    def tokens(self, patch: str) -> List[str]:
+        tokens: List[str] = []
+        for line in patch.split("\n"):
+            if line[:1] in ("+", "-") and not line.startswith(("+++", "---")):
+                tokens.append(line[0])  # Keeps added and removed code apart
+                tokens.extend(_TOKEN_RE.findall(line[1:]))
+        return tokens
+
+    def signature(self, tokens: List[str]) -> List[int]:
+        size = self.shingle_size
+        shingles = {
+            zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8"))
+            for i in range(max(1, len(tokens) - size + 1))
+        }
+        if len(shingles) > self.max_shingles:
+            shingles = set(heapq.nsmallest(self.max_shingles, shingles))
+        return [min((a * s + b) % _MERSENNE_PRIME for s in shingles) & _MAX_HASH for a, b in self.perms]
+
+
+def _pack(signature: List[int]) -> str:
+    return base64.b64encode(array.array("I", signature).tobytes()).decode("ascii")
+
+
+def _unpack(raw: str) -> List[int]:
+    return array.array("I", base64.b64decode(raw)).tolist()
+
+
+class SimilarReviewIndex:
+    """
+    Locality-sensitive index of reviewed file patches, so a change that
+    reappears in another PR (backport, cherry-pick, a fix copied across
+    services) reuses its findings instead of going back to the LLM.
+
+    Each signature is cut into SIMILARITY_BANDS bands of SIMILARITY_ROWS
+    values; every band is a Redis set of the entries sharing it. A lookup
+    reads its own bands, ranks the entries found by bands in common and
+    compares the top SIMILARITY_MAX_CANDIDATES signatures in full. Findings
+    are reused when the estimated Jaccard similarity reaches
+    SIMILARITY_THRESHOLD. Like the review cache, entries are scoped to the
+    model and prompt version and expire after SIMILARITY_TTL.
+    """
+
+    PREFIX = "sentinel:similar"
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings, prompt_version: str):
+        self.redis = redis
+        self.settings = settings
+        self.bands = settings.SIMILARITY_BANDS
+        self.rows = settings.SIMILARITY_ROWS
+        self.hasher = MinHasher(
+            self.bands * self.rows, settings.SIMILARITY_SHINGLE_SIZE, settings.SIMILARITY_MAX_SHINGLES
+        )
+        namespace = hashlib.sha256(f"{settings.LLM_MODEL_NAME}:{prompt_version}".encode("utf-8")).hexdigest()[:12]
+        self.prefix = f"{self.PREFIX}:{namespace}"
+
+    def _signature(self, patch: str) -> Optional[List[int]]:
+        tokens = self.hasher.tokens(patch)
+        if len(tokens) < self.settings.SIMILARITY_MIN_TOKENS:
+            return None
+        return self.hasher.signature(tokens)
+
+    async def signature(self, patch: str) -> Optional[List[int]]:
+        """MinHash signature of a patch (None if too small to match), computed off the event loop."""
+        return await asyncio.to_thread(self._signature, patch)
+
+    def _band_keys(self, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(array.array("I", values).tobytes(), digest_size=8).hexdigest()
+            keys.append(f"{self.prefix}:b{band}:{digest}")
+        return keys
+
+    def _entry_key(self, entry_id: str) -> str:
+        return f"{self.prefix}:e:{entry_id}"
+
+    @staticmethod
+    def _entry_id(signature: List[int]) -> str:
+        return hashlib.sha256(array.array("I", signature).tobytes()).hexdigest()[:32]
+
+    async def find(self, patch: str, signature: Optional[List[int]]) -> Optional[SimilarReview]:
+        """Best indexed match for `patch`, given its `signature()`."""
+        if signature is None:
+            SIMILARITY.labels("skipped").inc()
+            return None
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self._band_keys(signature):
+                pipe.smembers(key)
+            buckets = await pipe.execute()
+
+        shared = Counter(entry_id for bucket in buckets for entry_id in bucket)
+        candidates = [entry_id for entry_id, _ in shared.most_common(self.settings.SIMILARITY_MAX_CANDIDATES)]
+        if not candidates:
+            SIMILARITY.labels("miss").inc()
+            return None
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entry_id in candidates:
+                pipe.hgetall(self._entry_key(entry_id))
+            entries = await pipe.execute()
+
+        best: Optional[SimilarReview] = None
+        for entry in entries:
+            if not entry or "sig" not in entry:
+                continue  # Expired; its band memberships linger until they expire too
+            other = _unpack(entry["sig"])
+            score = sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+            if best is None or score > best.score:
+                best = SimilarReview(entry.get("findings", ""), entry.get("file", ""), score)
+
+        if best is not None:
+            SIMILARITY_SCORE.observe(best.score)
+        if best is None or best.score < self.settings.SIMILARITY_THRESHOLD:
+            SIMILARITY.labels("miss").inc()
+            return None
+
+        SIMILARITY.labels("hit").inc()
+        SIMILARITY_TOKENS_SAVED.labels("in").inc(estimate_tokens(patch))
+        SIMILARITY_TOKENS_SAVED.labels("out").inc(estimate_tokens(best.findings))
+        return best
+
+    async def add(self, filename: str, findings: str, signature: Optional[List[int]]):
+        """Indexes the findings of a reviewed patch under its `signature()`."""
+        if signature is None or not findings:
+            return
+
+        entry_id = self._entry_id(signature)
+        ttl = self.settings.SIMILARITY_TTL
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(
+                self._entry_key(entry_id),
+                mapping={"sig": _pack(signature), "findings": findings, "file": filename},
+            )
+            pipe.expire(self._entry_key(entry_id), ttl)
+            for key in self._band_keys(signature):
+                pipe.sadd(key, entry_id)
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    @staticmethod
+    def adapt(match: SimilarReview, filename: str) -> str:
+        """Points reused findings at the file under review and says where they came from."""
+        text = match.findings
+        if match.filename and filename and match.filename != filename:
+            pattern = re.compile(_PATH_BEFORE + re.escape(match.filename) + _PATH_AFTER)
+            text = pattern.sub(lambda _: filename, text)
+        if text.strip().startswith("LGTM"):
+            return text
+        return f"_Same findings as a {match.score:.0%} similar change reviewed earlier._\n\n{text}"
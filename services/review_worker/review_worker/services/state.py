@@ -0,0 +1,25 @@
+from typing import Optional
+from redis import asyncio as aioredis
+from review_worker.config import Settings
+
+
+class ReviewStateStore:
+    """
+    Remembers the last head SHA reviewed for each PR, so follow-up pushes
+    can be reviewed incrementally against it.
+    """
+
+    PREFIX = "sentinel:pr_reviewed"
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.ttl = settings.REVIEW_STATE_TTL
+
+    def _key(self, repo_name: str, pr_number: int) -> str:
+        return f"{self.PREFIX}:{repo_name}#{pr_number}"
+
+    async def get_last_reviewed(self, repo_name: str, pr_number: int) -> Optional[str]:
+        return await self.redis.get(self._key(repo_name, pr_number))
+
+    async def set_last_reviewed(self, repo_name: str, pr_number: int, head_sha: str):
+        await self.redis.set(self._key(repo_name, pr_number), head_sha, ex=self.ttl)
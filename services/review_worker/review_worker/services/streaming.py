@@ -0,0 +1,66 @@
+import asyncio
+from typing import Dict, List, Optional
+from shared.events import ChunkEvent, EventBus
+
+
+class ReviewStreamPublisher:
+    """
+    Forwards review text to dashboards while the LLM is still generating it.
+
+    `write()` only appends to an in-memory buffer; a background task
+    hands whatever accumulated to the event bus every `interval` seconds
+    (sooner once `max_chars` are buffered) as one `chunk` event per file,
+    so Redis sees a handful of messages per second instead of one per token.
+    """
+
+    def __init__(
+        self,
+        events: EventBus,
+        job_id: str,
+        repo: str,
+        pr: int,
+        interval: float = 0.2,
+        max_chars: int = 2048,
+    ):
+        self.events = events
+        self.job_id = job_id
+        self.repo = repo
+        self.pr = pr
+        self.interval = interval
+        self.max_chars = max_chars
+        self._buffers: Dict[str, List[str]] = {}
+        self._buffered = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ReviewStreamPublisher":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.flush()
+
+    def write(self, file: str, text: str):
+        if not text:
+            return
+        self._buffers.setdefault(file, []).append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.max_chars:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        buffers, self._buffers, self._buffered = self._buffers, {}, 0
+        for file, parts in buffers.items():
+            self.events.publish(ChunkEvent(self.job_id, self.repo, pr=self.pr, file=file, text="".join(parts)))
@@ -0,0 +1,229 @@
+import re
+import ast
+import os
+import logging
+import textwrap
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from typing import List, Optional, Sequence, Tuple
+from review_worker.config import Settings
+from review_worker.metrics import TRIAGE
+from review_worker.services.diff import format_file_header, split_diff_by_file, split_hunks
+
+logger = logging.getLogger(__name__)
+
+_HUNK_START_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)")
+_IMPORT_RE = re.compile(r"^(import|from)\s+\S+")
+
+
+class PathRules:
+    """Decides from its path alone whether a changed file is reviewed."""
+
+    def __init__(self, include: Sequence[str], exclude: Sequence[str]):
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "PathRules":
+        return cls(settings.REVIEW_INCLUDE_PATHS, settings.REVIEW_EXCLUDE_PATHS)
+
+    def matches(self, filename: str) -> bool:
+        if not any(fnmatch(filename, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatch(filename, pattern) for pattern in self.exclude)
+
+
+@dataclass
+class TriageResult:
+    """The diff left to review, the files dropped entirely (with why), and how many hunks were cut."""
+    text: str = ""
+    dropped: List[Tuple[str, str]] = field(default_factory=list)
+    trivial_hunks: int = 0
+
+
+class DiffTriage:
+    """
+    Cheap local pass over a PR diff before any LLM call.
+
+    Generated files are dropped, as are hunks that only change whitespace,
+    comments or import order, or (for Python) that parse to the same AST
+    before and after. A file with no hunks left is dropped; if nothing is
+    left at all, the pipeline posts LGTM without calling the model.
+    """
+
+    def __init__(self, settings: Settings):
+        self.generated_markers = settings.TRIAGE_GENERATED_MARKERS
+        self.comment_prefixes = settings.TRIAGE_COMMENT_PREFIXES
+        self.block_comments = settings.TRIAGE_BLOCK_COMMENTS
+
+    def apply(self, diff: str) -> TriageResult:
+        result = TriageResult()
+        parts: List[str] = []
+        for filename, patch in split_diff_by_file(diff):
+            if filename is None:
+                # Not a GitHub diff (e.g. a manual submission): nothing to triage
+                parts.append(patch)
+                continue
+
+            if self._is_generated(patch):
+                result.dropped.append((filename, "generated file"))
+                TRIAGE.labels("file", "generated").inc()
+                continue
+
+            kept: List[str] = []
+            reasons: List[str] = []
+            for hunk in split_hunks(patch):
+                reason = self._trivial_reason(filename, hunk)
+                if reason is None:
+                    kept.append(hunk)
+                else:
+                    reasons.append(reason)
+                    TRIAGE.labels("hunk", reason).inc()
+
+            result.trivial_hunks += len(reasons)
+            if kept:
+                parts.append(format_file_header(filename))
+                parts.append("\n".join(kept))
+            else:
+                result.dropped.append((filename, f"only {', '.join(sorted(set(reasons)))} changes"))
+
+        result.text = "".join(parts)
+        if result.trivial_hunks or result.dropped:
+            logger.info(f"Triage cut {result.trivial_hunks} trivial hunk(s), dropped {len(result.dropped)} file(s)")
+        return result
+
+    def _is_generated(self, patch: str) -> bool:
+        # Generation banners sit at the top of the file, so only a hunk starting at line 1 can show one
+        match = _HUNK_START_RE.match(patch)
+        if not match or int(match.group(1)) > 1:
+            return False
+        head = patch.split("\n", 20)[:20]
+        return any(marker in line for line in head for marker in self.generated_markers)
+
+    def _trivial_reason(self, filename: str, hunk: str) -> Optional[str]:
+        old: List[str] = []
+        new: List[str] = []
+        removed: List[str] = []
+        added: List[str] = []
+        for line in hunk.split("\n")[1:]:
+            tag, text = line[:1], line[1:]
+            if tag == "-":
+                removed.append(text)
+                old.append(text)
+            elif tag == "+":
+                added.append(text)
+                new.append(text)
+            elif tag == " " or line == "":
+                old.append(text)
+                new.append(text)
+
+        if not removed and not added:
+            return None
+        ext = os.path.splitext(filename)[1]
+        if self._same_lines(filename, removed, added):
+            return "whitespace"
+
+        if self._only_comments(ext, hunk):
+            return "comment"
+
+        changed = [line.strip() for line in removed + added if line.strip()]
+        if changed and all(_IMPORT_RE.match(line) for line in changed):
+            if sorted(r.strip() for r in removed if r.strip()) == sorted(a.strip() for a in added if a.strip()):
+                return "import order"
+
+        if filename.endswith(".py") and _same_python_ast("\n".join(old), "\n".join(new)):
+            return "formatting"
+        return None
+
+    @staticmethod
+    def _same_lines(filename: str, removed: List[str], added: List[str]) -> bool:
+        """
+        True if the changed lines match one for one once trailing whitespace
+        (and, where it carries no meaning, indentation) is ignored. Blank
+        lines aside, spacing inside a line is never normalized: it can sit
+        in a string literal.
+        """
+        keep_indent = _indent_significant(filename)
+
+        def normalize(lines: List[str]) -> List[str]:
+            return [line.rstrip() if keep_indent else line.strip() for line in lines if line.strip()]
+
+        return normalize(removed) == normalize(added)
+
+    def _only_comments(self, ext: str, hunk: str) -> bool:
+        """
+        True if every changed line is a comment: it starts with a line
+        comment prefix, or lies inside a block comment. Block state is
+        followed separately on the old and new side; a line the hunk cannot
+        place (e.g. a leading '*' with no opening delimiter in sight) counts
+        as code.
+        """
+        prefixes = tuple(self.comment_prefixes.get(ext, []))
+        opener, closer = (self.block_comments.get(ext) or [None, None])[:2]
+        if not prefixes and not opener:
+            return False
+
+        in_block = {"-": False, "+": False}
+        changed = 0
+        for line in hunk.split("\n")[1:]:
+            tag, text = line[:1], line[1:].strip()
+            sides = ["-", "+"] if tag in (" ", "") else [tag] if tag in ("-", "+") else []
+            for side in sides:
+                is_comment, in_block[side] = _classify(text, in_block[side], prefixes, opener, closer)
+                if tag == side and text:
+                    changed += 1
+                    if not is_comment:
+                        return False
+        return changed > 0
+
+
+# Files whose indentation is syntax: leading whitespace changes are not cosmetic there
+_INDENT_SIGNIFICANT_EXTS = {".py", ".pyi", ".yml", ".yaml", ".coffee", ".haml", ".pug", ".sass", ".nim", ".fs"}
+_INDENT_SIGNIFICANT_NAMES = {"Makefile", "GNUmakefile"}
+
+
+def _indent_significant(filename: str) -> bool:
+    base = os.path.basename(filename)
+    return base in _INDENT_SIGNIFICANT_NAMES or os.path.splitext(base)[1] in _INDENT_SIGNIFICANT_EXTS or base.endswith(".mk")
+
+
+def _classify(
+    text: str, in_block: bool, prefixes: Tuple[str, ...], opener: Optional[str], closer: Optional[str]
+) -> Tuple[bool, bool]:
+    """Returns (line is entirely comment, inside a block comment after the line)."""
+    if not text:
+        return True, in_block
+    if in_block:
+        if closer and closer in text:
+            rest = text.split(closer, 1)[1].strip()
+            return not rest, False
+        return True, True
+    if prefixes and text.startswith(prefixes):
+        return True, False
+    if opener and text.startswith(opener):
+        body = text[len(opener):]
+        if closer and closer in body:
+            rest = body.split(closer, 1)[1].strip()
+            return not rest, False
+        return True, True
+    return False, False
+
+
+def _same_python_ast(old: str, new: str) -> bool:
+    """True if both snippets parse and differ only in layout, comments or docstrings."""
+    try:
+        before = ast.parse(textwrap.dedent(old))
+        after = ast.parse(textwrap.dedent(new))
+    except (SyntaxError, ValueError):
+        # Hunks often start or end mid-statement; those simply go to the LLM
+        return False
+    return ast.dump(_strip_docstrings(before)) == ast.dump(_strip_docstrings(after))
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            first = node.body[0] if node.body else None
+            if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+                node.body = node.body[1:]
+    return tree
@@ -0,0 +1,133 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+from review_worker.config import Settings
+
+logger = logging.getLogger("Review-Worker.Supervisor")
+
+
+def _child_main(index: int):
+    """Entry point of one worker process (spawned, so settings are re-read from the environment)."""
+    from review_worker.config import settings
+    from review_worker.worker import main
+
+    # Keep per-process identities distinct
+    settings.METRICS_PORT += index
+    if settings.QUEUE_CONSUMER_NAME:
+        settings.QUEUE_CONSUMER_NAME = f"{settings.QUEUE_CONSUMER_NAME}-{index}"
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+class _Slot:
+    """One worker position: the current process and its restart history."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+
+class WorkerSupervisor:
+    """
+    Runs WORKER_PROCESSES review workers, each a separate process with its
+    own event loop, so CPU work (JSON, diff assembly, langchain) uses every
+    core.
+
+    A worker that exits unexpectedly is restarted after an exponential
+    backoff (WORKER_RESTART_BACKOFF_BASE doubling up to _MAX), reset once it
+    stays up for a minute. SIGTERM / SIGINT are forwarded to the workers,
+    which drain (see ReviewPipeline.stop); any still running after
+    WORKER_DRAIN_TIMEOUT plus a grace period are killed.
+
+    Worker i exposes metrics on METRICS_PORT + i.
+    """
+
+    STABLE_AFTER = 60.0  # Seconds of uptime that reset the backoff
+    KILL_GRACE = 10.0
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.context = multiprocessing.get_context("spawn")
+        self.slots: Dict[int, _Slot] = {i: _Slot(i) for i in range(max(1, settings.WORKER_PROCESSES))}
+        self._stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        logger.info(f"Supervisor {os.getpid()} starting {len(self.slots)} worker process(es)...")
+        for slot in self.slots.values():
+            self._start(slot)
+
+        while not self._stopping:
+            self._reap()
+            self._restart_due()
+            sentinels = [s.process.sentinel for s in self.slots.values() if s.process is not None]
+            wait(sentinels, timeout=0.5)
+
+        self._shutdown()
+
+    def _on_signal(self, signum, frame):
+        if not self._stopping:
+            logger.info(f"Received {signal.Signals(signum).name}; draining workers...")
+        self._stopping = True
+
+    def _start(self, slot: _Slot):
+        process = self.context.Process(target=_child_main, args=(slot.index,), name=f"review-worker-{slot.index}")
+        process.start()
+        slot.process = process
+        slot.started_at = time.monotonic()
+        logger.info(f"Started worker {slot.index} (pid {process.pid})")
+
+    def _reap(self):
+        now = time.monotonic()
+        for slot in self.slots.values():
+            process = slot.process
+            if process is None or process.is_alive():
+                continue
+
+            slot.process = None
+            if now - slot.started_at >= self.STABLE_AFTER:
+                slot.failures = 0
+            delay = min(
+                self.settings.WORKER_RESTART_BACKOFF_MAX,
+                self.settings.WORKER_RESTART_BACKOFF_BASE * (2 ** slot.failures),
+            )
+            slot.failures += 1
+            slot.restart_at = now + delay
+            logger.warning(
+                f"Worker {slot.index} (pid {process.pid}) exited with code {process.exitcode}; "
+                f"restarting in {delay:.1f}s"
+            )
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for slot in self.slots.values():
+            if slot.process is None and now >= slot.restart_at:
+                self._start(slot)
+
+    def _shutdown(self):
+        running = [s.process for s in self.slots.values() if s.process is not None and s.process.is_alive()]
+        for process in running:
+            os.kill(process.pid, signal.SIGTERM)  # type: ignore[arg-type]
+
+        deadline = time.monotonic() + self.settings.WORKER_DRAIN_TIMEOUT + self.KILL_GRACE
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"Worker pid {process.pid} did not drain in time; killing it.")
+                process.kill()
+                process.join()
+
+        logger.info("All workers stopped.")
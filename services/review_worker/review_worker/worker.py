@@ -1,102 +1,83 @@
-import json
+import signal
 import asyncio
 import logging
-from shared.providers.redis import RedisFactory
+from shared.providers.redis import CACHE_CLIENT, PUBSUB_CLIENT, RedisFactory
+from shared.providers.queue import QueueFactory
 from review_worker.providers.llm import LLMFactory
 from review_worker.config import settings
+from review_worker.pipeline import ReviewPipeline
 from shared.logging import setup_logging
+from shared.metrics import start_metrics_server
 
 # Services
 from review_worker.services.github import GitHubService
-from review_worker.services.reviewer import ReviewerAgent
+from review_worker.services.reviewer import ReviewerAgent, PROMPT_VERSION
+from review_worker.services.cache import ReviewCache
+from review_worker.services.similarity import SimilarReviewIndex
 
 setup_logging()
 logger = logging.getLogger("Review-Worker")
 
+def build_pipeline() -> ReviewPipeline:
+    """Wires a review pipeline and its services onto the process's named Redis clients."""
+    redis = RedisFactory.get_client(settings)
+    queue = QueueFactory.get_queue(settings)
+    llm = LLMFactory.get_llm(settings, redis)
+
+    github_service = GitHubService(settings, redis)
+    cache = (
+        ReviewCache(RedisFactory.get_client(settings, name=CACHE_CLIENT), settings, PROMPT_VERSION)
+        if settings.REVIEW_CACHE_ENABLED
+        else None
+    )
+    similar = (
+        SimilarReviewIndex(RedisFactory.get_client(settings, name=CACHE_CLIENT), settings, PROMPT_VERSION)
+        if settings.SIMILARITY_ENABLED
+        else None
+    )
+    reviewer = ReviewerAgent(
+        llm,
+        cache,
+        chunk_tokens=max(
+            256, settings.LLM_CONTEXT_TOKENS - settings.LLM_MAX_TOKENS - settings.LLM_PROMPT_OVERHEAD_TOKENS
+        ),
+        # The adaptive limiter (LLM_RATE_LIMIT_ENABLED) sizes concurrency itself; a fixed cap here would pin it
+        max_concurrency=None if settings.LLM_RATE_LIMIT_ENABLED else settings.LLM_MAX_CONCURRENCY,
+        similar=similar,
+    )
+
+    return ReviewPipeline(
+        redis, queue, github_service, reviewer, settings,
+        events_redis=RedisFactory.get_client(settings, name=PUBSUB_CLIENT),
+    )
+
 async def main():
     logger.info("Starting GitSentinel Worker...")
 
     # Initialize Dependencies
-    redis = RedisFactory.get_client(settings)
-    llm = LLMFactory.get_llm(settings)
-
-    github_service = GitHubService(settings)
-    reviewer = ReviewerAgent(llm)
-
-    logger.info("Listening for PRs on 'review_jobs'...")
-
-    while True:
-        try:
-            # Blocking pop from Redis is already async-safe in aioredis
-            result = await redis.brpop(["review_jobs"], timeout=2)  # type: ignore
-
-            if result:
-                _, data = result
-                job = json.loads(data)
-
-                repo = job.get("repo_name", "Unknown Repo")
-                pr_id = job.get("pr_number", 0)
-                source = job.get("source", "github")
-
-                # Broadcast START
-                await redis.publish("sentinel_events", json.dumps({
-                    "type": "log", 
-                    "message": f"Picked up {source.upper()} job for {repo}"
-                }))
-
-                diff_text = ""
-
-                # Fetch Code (GitHub or Manual)
-                if source == "manual":
-                    diff_text = job.get("code", "")
-                    logger.info("Processing manual code review request.")
-                else:
-                    logger.info(f"Analyzing PR #{pr_id} in {repo}...")
-                    try:
-                        diff_text = await github_service.get_pr_diff(repo, pr_id)
-                    except Exception as e:
-                        logger.error(f"GitHub Fetch Failed: {e}")
-                        await redis.publish("sentinel_events", json.dumps({
-                            "type": "error", "message": f"GitHub Error: {str(e)}"
-                        }))
-                        continue
-
-                if not diff_text:
-                    logger.info("No relevant code changes found.")
-                    await redis.publish("sentinel_events", json.dumps({
-                        "type": "log", "message": "No code changes found to analyze."
-                    }))
-                    continue
-
-                # Broadcast ANALYZING
-                await redis.publish("sentinel_events", json.dumps({
-                    "type": "log",
-                    "message": "Analyzing code logic...",
-                }))
-
-                # AI Review
-                review_comments = await reviewer.analyze_code(diff_text)
-
-                if review_comments:
-                    formatted_msg = f"## GitSentinel Review\n\n{review_comments}"
-                    
-                    # Handle Output (Post to GitHub OR just Log)
-                    if source == "github":
-                        await github_service.post_comment(repo, pr_id, formatted_msg)
-                        logger.info(f"Posted review for PR #{pr_id}")
-                    
-                    # Broadcast SUCCESS (Payload includes the full review for Frontend)
-                    await redis.publish("sentinel_events", json.dumps({
-                        "type": "success",
-                        "repo": repo,
-                        "pr": pr_id,
-                        "message": "Analysis Complete!",
-                        "review": review_comments # Frontend can optionally display this
-                    }))
-
-        except Exception as e:
-            logger.error(f"Error processing job: {e}")
-            await asyncio.sleep(1)
+    pipeline = build_pipeline()
+    metrics_server = None
+    if settings.METRICS_ENABLED:
+        metrics_server = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+
+    logger.info(
+        f"Listening for PRs on '{settings.QUEUE_NAME}' ({settings.QUEUE_BACKEND}) "
+        f"(fetch={settings.WORKER_FETCH_CONCURRENCY}, "
+        f"analyze={settings.WORKER_ANALYZE_CONCURRENCY}, "
+        f"post={settings.WORKER_POST_CONCURRENCY})..."
+    )
+    # SIGTERM / Ctrl-C drain the pipeline instead of killing in-flight reviews
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, pipeline.stop)
+
+    try:
+        await pipeline.run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await pipeline.github_service.close()
+        await RedisFactory.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
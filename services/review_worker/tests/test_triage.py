@@ -0,0 +1,52 @@
+from review_worker.config import settings
+from review_worker.services.triage import DiffTriage
+
+
+def reason(filename: str, *lines: str):
+    hunk = "\n".join(["@@ -1,4 +1,4 @@", *lines])
+    return DiffTriage(settings)._trivial_reason(filename, hunk)
+
+
+def test_trailing_whitespace_is_trivial():
+    assert reason("app.py", "-x = 1   ", "+x = 1") == "whitespace"
+
+
+def test_reindent_is_trivial_where_indentation_has_no_meaning():
+    assert reason("app.js", "-  call();", "+    call();") == "whitespace"
+
+
+def test_dedent_out_of_python_block_is_not_trivial():
+    assert reason("app.py", " if ready:", "     start()", "-    stop()", "+stop()") is None
+
+
+def test_space_inside_string_literal_is_not_trivial():
+    assert reason("app.py", "-x = 'a b'", "+x = 'ab'") is None
+    assert reason("app.js", "-const x = 'a b';", "+const x = 'ab';") is None
+
+
+def test_merging_lines_is_not_whitespace():
+    assert reason("app.js", "-a = b", "-  + c;", "+a = b + c;") is None
+
+
+def test_line_comment_change_is_trivial():
+    assert reason("app.py", " x = 1", "-# old note", "+# new note") == "comment"
+
+
+def test_pointer_dereference_is_not_a_comment():
+    assert reason("main.go", "-*ptr = x", "+*ptr = y") is None
+
+
+def test_star_lines_inside_block_comment_are_comments():
+    assert reason("Main.java", " /*", "- * old", "+ * new", " */") == "comment"
+
+
+def test_code_after_block_comment_close_is_not_a_comment():
+    assert reason("app.ts", " /* note", "-*/ a = 1;", "+*/ a = 2;") is None
+
+
+def test_python_formatting_is_trivial():
+    assert reason("app.py", "-call(a,b)", "+call(a, b)") == "formatting"
+
+
+def test_import_reorder_is_trivial():
+    assert reason("app.py", "-import os", "-import sys", "+import sys", "+import os") == "import order"
@@ -0,0 +1,85 @@
+import logging
+from typing import Optional
+from redis import asyncio as aioredis
+from shared.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobCoalescer:
+    """
+    Keeps redundant PR reviews out of the queue.
+
+    - Redelivered webhooks are dropped by their X-GitHub-Delivery id.
+    - Pushes to the same PR share one queued job: the gateway records the
+      newest head SHA and only enqueues when no job is pending for the PR;
+      the worker reads the newest head when it picks the job up.
+    - Workers compare their head against the newest one to drop results
+      for heads that were superseded while in flight.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.settings = settings
+
+    @staticmethod
+    def pr_key(repo_name: str, pr_number: int) -> str:
+        return f"{repo_name}#{pr_number}"
+
+    @classmethod
+    def _tagged(cls, repo_name: str, pr_number: int) -> str:
+        # Hash tag: a PR's head and pending keys share a cluster slot, so MULTI can cover both
+        return f"{{{cls.pr_key(repo_name, pr_number)}}}"
+
+    async def is_duplicate_delivery(self, delivery_id: Optional[str]) -> bool:
+        """Returns True if this delivery id was already accepted."""
+        if not delivery_id:
+            return False
+        created = await self.redis.set(
+            f"sentinel:delivery:{delivery_id}", 1, nx=True, ex=self.settings.DELIVERY_DEDUPE_TTL
+        )
+        return not created
+
+    async def offer(self, repo_name: str, pr_number: int, head_sha: Optional[str]) -> bool:
+        """
+        Records `head_sha` as the newest head of the PR.
+        Returns True if a job must be enqueued, False if a pending one covers it.
+        """
+        key = self._tagged(repo_name, pr_number)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Head first: a worker that clears `pending` always sees this head
+            if head_sha:
+                pipe.set(f"sentinel:pr_head:{key}", head_sha, ex=self.settings.COALESCE_HEAD_TTL)
+            pipe.set(f"sentinel:pr_pending:{key}", 1, nx=True, ex=self.settings.COALESCE_PENDING_TTL)
+            results = await pipe.execute()
+        return bool(results[-1])
+
+    async def abandon(self, delivery_id: Optional[str], repo_name: str, pr_number: int):
+        """
+        Undoes `is_duplicate_delivery` and `offer` for a job that could not be
+        enqueued, so GitHub's redelivery (or the next push) is accepted.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if delivery_id:
+                pipe.delete(f"sentinel:delivery:{delivery_id}")
+            pipe.delete(f"sentinel:pr_pending:{self._tagged(repo_name, pr_number)}")
+            await pipe.execute()
+
+    async def begin(self, repo_name: str, pr_number: int) -> Optional[str]:
+        """
+        Called by the worker when it starts a PR job.
+        Reopens the PR for enqueueing and returns the newest head SHA.
+        """
+        key = self._tagged(repo_name, pr_number)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(f"sentinel:pr_pending:{key}")
+            pipe.get(f"sentinel:pr_head:{key}")
+            _, head = await pipe.execute()
+        return head
+
+    async def is_current(self, repo_name: str, pr_number: int, head_sha: Optional[str]) -> bool:
+        """Returns False if a newer head has been pushed since `head_sha`."""
+        if not head_sha:
+            return True
+        latest = await self.redis.get(f"sentinel:pr_head:{self._tagged(repo_name, pr_number)}")
+        return latest is None or latest == head_sha
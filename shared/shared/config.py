@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
@@ -10,11 +10,69 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "DEBUG" if DEBUG else "INFO"
     
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_STRATEGY: str = "standard"  # or "cluster", "sentinel", "mock"
+    REDIS_MAX_CONNECTIONS: int = 10  # Pool size of clients not listed in REDIS_POOL_SIZES
+    REDIS_POOL_SIZES: Dict[str, int] = {"queue": 20, "pubsub": 10, "cache": 20}  # Per named client
+    REDIS_CLIENT_URLS: Dict[str, str] = {}  # Point a named client at a different server
+    REDIS_SENTINELS: List[str] = []  # "host:port" of each Sentinel ("sentinel" strategy)
+    REDIS_SENTINEL_MASTER: str = "mymaster"
 
     # GitHub Tokens
     GITHUB_API_TOKEN: str = ""
     WEBHOOK_SECRET: str = ""
 
+    # Job Queue
+    QUEUE_BACKEND: str = "list"  # or "stream" (Redis Streams consumer group)
+    QUEUE_NAME: str = "review_jobs"
+    QUEUE_SHARDS: int = 1  # >1 spreads the queue over hash-tagged keys (one cluster slot each)
+    QUEUE_READ_COUNT: int = 10  # Max jobs fetched per read
+    QUEUE_STREAM_GROUP: str = "review_workers"
+    QUEUE_STREAM_MAXLEN: int = 100_000
+    QUEUE_CLAIM_IDLE_MS: int = 300_000  # Reclaim entries idle this long from dead consumers
+    QUEUE_HEARTBEAT_INTERVAL: float = 60.0  # Seconds between claim refreshes of held jobs (< QUEUE_CLAIM_IDLE_MS)
+    QUEUE_CONSUMER_NAME: Optional[str] = None  # Defaults to "<hostname>-<pid>"
+    QUEUE_FAIR_TENANT_BY: str = "repo"  # "fair" backend: one sub-queue per "repo" or "installation"
+    QUEUE_FAIR_WEIGHTS: Dict[str, float] = {}  # Tenant -> weight (default 1.0)
+    QUEUE_FAIR_MANUAL_PRIORITY: bool = True  # Serve manual reviews ahead of all tenants
 
+    # Retries and dead-lettering of failed jobs
+    RETRY_ENABLED: bool = True
+    RETRY_MAX_ATTEMPTS: int = 5  # Retries before a job is dead-lettered
+    RETRY_BACKOFF_BASE: float = 10.0  # Seconds before the first retry, doubling per attempt (with jitter)
+    RETRY_BACKOFF_MAX: float = 900.0
+    # Error class name (or any base class name) -> overrides of max_attempts / base_delay / max_delay
+    RETRY_POLICIES: Dict[str, Dict[str, float]] = {
+        "ValueError": {"max_attempts": 0},  # Malformed job: retrying will not help
+        "KeyError": {"max_attempts": 0},
+        "TypeError": {"max_attempts": 0},
+        "BadRequest": {"max_attempts": 1},  # GitHub 4xx (e.g. PR or repo gone)
+        "RateLimitError": {"max_attempts": 10, "base_delay": 30},  # LLM provider quota
+    }
+    RETRY_PROMOTE_INTERVAL: float = 1.0  # Seconds between scans for due retries
+    RETRY_PROMOTE_BATCH: int = 100
+    DEAD_LETTER_MAXLEN: int = 10_000  # Oldest dead jobs are discarded beyond this
 
-settings = Settings()
\ No newline at end of file
+    # Review history (compressed records plus sorted-set indexes by repo, PR and source)
+    HISTORY_ENABLED: bool = True
+    HISTORY_RETENTION: int = 30 * 86_400  # Seconds a review stays queryable
+
+    # Metrics
+    METRICS_ENABLED: bool = True
+    METRICS_INCLUDE_REPO: bool = True  # Turn off to cap label cardinality on busy installs
+
+    # Event bus (sentinel_events): buffered, pipelined publishing plus a capped per-job replay log
+    EVENT_BUS_FLUSH_INTERVAL: float = 0.05  # Seconds between flushes
+    EVENT_BUS_BATCH_SIZE: int = 100  # Flush early once this many events are buffered
+    EVENT_BUS_MAX_BUFFER: int = 10_000  # Oldest events are dropped beyond this while Redis is down
+    EVENT_LOG_ENABLED: bool = True
+    EVENT_LOG_MAXLEN: int = 500  # Events kept per job
+    EVENT_LOG_TTL: int = 86_400
+
+    # Job Coalescing
+    DELIVERY_DEDUPE_TTL: int = 86_400  # Remember X-GitHub-Delivery ids for a day
+    COALESCE_HEAD_TTL: int = 86_400
+    COALESCE_PENDING_TTL: int = 900  # Safety net if a queued job is lost
+
+
+
+settings = Settings()
@@ -0,0 +1,147 @@
+"""
+Typed progress events and the buffered bus that publishes them.
+
+Workers describe what happens to a job with the dataclasses below and
+hand them to `EventBus.publish()`, which only appends to a buffer. A
+background task flushes the buffer over one Redis pipeline per batch:
+each event is PUBLISHed on `sentinel_events` and, optionally, appended
+to a capped per-job stream so dashboards that connect late can replay
+the job's history (`read_job_events`).
+"""
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar, Deque, List, Optional
+from redis import asyncio as aioredis
+from shared.config import Settings
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "sentinel_events"
+
+
+def job_log_key(job_id: str) -> str:
+    return f"sentinel:events:{job_id}"
+
+
+@dataclass
+class JobEvent:
+    """Base of every event: which job, in which repo, and when."""
+    type: ClassVar[str] = ""
+    job_id: str
+    repo: str
+    ts: float = field(default_factory=time.time, kw_only=True)
+
+    def to_json(self) -> str:
+        return json.dumps({"type": self.type, **asdict(self)})
+
+
+@dataclass
+class LogEvent(JobEvent):
+    type: ClassVar[str] = "log"
+    message: str
+
+
+@dataclass
+class ErrorEvent(JobEvent):
+    type: ClassVar[str] = "error"
+    message: str
+
+
+@dataclass
+class ChunkEvent(JobEvent):
+    """Partial review text for one file, while the LLM is generating it."""
+    type: ClassVar[str] = "chunk"
+    pr: int
+    file: str
+    text: str
+
+
+@dataclass
+class SuccessEvent(JobEvent):
+    type: ClassVar[str] = "success"
+    pr: int
+    message: str
+    review: str
+
+
+async def read_job_events(redis: aioredis.Redis, job_id: str, count: Optional[int] = None) -> List[str]:
+    """Returns the JSON events logged for a job, oldest first."""
+    entries = await redis.xrange(job_log_key(job_id), count=count)
+    return [fields["event"] for _, fields in entries if "event" in fields]
+
+
+class EventBus:
+    """
+    Non-blocking event publisher. Call `start()` before publishing and
+    `stop()` on shutdown (it flushes what is left).
+
+    Events are flushed every EVENT_BUS_FLUSH_INTERVAL seconds, or as soon
+    as EVENT_BUS_BATCH_SIZE are waiting. If Redis is unreachable the buffer
+    keeps at most EVENT_BUS_MAX_BUFFER events, dropping the oldest: losing
+    telemetry is preferable to stalling or failing reviews.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.settings = settings
+        self._buffer: Deque[JobEvent] = deque(maxlen=max(1, settings.EVENT_BUS_MAX_BUFFER))
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event-bus")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def publish(self, event: JobEvent):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # The deque discards the oldest event
+        self._buffer.append(event)
+        if len(self._buffer) >= self.settings.EVENT_BUS_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.EVENT_BUS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.settings.EVENT_BUS_BATCH_SIZE))]
+            try:
+                await self._send(batch)
+            except Exception as e:
+                logger.warning(f"Failed to publish {len(batch)} event(s): {e}")
+                # Put them back (in order) and retry on the next tick
+                self._buffer.extendleft(reversed(batch))
+                return
+
+    async def _send(self, batch: List[JobEvent]):
+        log = self.settings.EVENT_LOG_ENABLED
+        async with self.redis.pipeline(transaction=False) as pipe:
+            logged = set()
+            for event in batch:
+                data = event.to_json()
+                pipe.publish(EVENTS_CHANNEL, data)
+                if log:
+                    key = job_log_key(event.job_id)
+                    pipe.xadd(key, {"event": data}, maxlen=self.settings.EVENT_LOG_MAXLEN, approximate=True)
+                    logged.add(key)
+            for key in logged:
+                pipe.expire(key, self.settings.EVENT_LOG_TTL)
+            await pipe.execute()
@@ -0,0 +1,128 @@
+"""
+Persisted history of completed reviews.
+
+Workers write one record per finished review; the gateway answers
+queries from sorted-set indexes (all, per repo, per PR, per source)
+scored by completion time, so a page costs one range read plus one GET
+per record, however many reviews are stored.
+"""
+import json
+import time
+import zlib
+import base64
+import logging
+from typing import List, Optional, Tuple
+from redis import asyncio as aioredis
+from shared.config import Settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "sentinel:history"
+
+# Left out of query results unless the full record is asked for
+_DETAIL_FIELDS = ("review", "skipped_files")
+
+
+def _encode(record: dict) -> str:
+    # Clients decode responses as text, so the compressed bytes travel as base64
+    return base64.b64encode(zlib.compress(json.dumps(record).encode("utf-8"), 6)).decode("ascii")
+
+
+def _decode(raw: str) -> dict:
+    return json.loads(zlib.decompress(base64.b64decode(raw)))
+
+
+class ReviewHistory:
+    """
+    Review records kept for HISTORY_RETENTION seconds.
+
+    A record is a dict with at least `job_id`, `repo`, `pr`, `source` and
+    `finished_at`; workers also store head/base SHA, per-stage timings,
+    token counts, skipped files and the review text.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.retention = settings.HISTORY_RETENTION
+
+    @staticmethod
+    def record_key(job_id: str) -> str:
+        return f"{PREFIX}:{job_id}"
+
+    @staticmethod
+    def index_key(repo: Optional[str] = None, pr: Optional[int] = None, source: Optional[str] = None) -> str:
+        if repo and pr is not None:
+            return f"{PREFIX}:idx:pr:{repo}#{pr}"
+        if repo:
+            return f"{PREFIX}:idx:repo:{repo}"
+        if source:
+            return f"{PREFIX}:idx:source:{source}"
+        return f"{PREFIX}:idx:all"
+
+    async def record(self, record: dict):
+        finished_at = record.setdefault("finished_at", time.time())
+        indexes = [
+            self.index_key(),
+            self.index_key(repo=record["repo"]),
+            self.index_key(source=record["source"]),
+        ]
+        if record["source"] == "github":
+            indexes.append(self.index_key(repo=record["repo"], pr=record["pr"]))
+
+        cutoff = time.time() - self.retention
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.record_key(record["job_id"]), _encode(record), ex=self.retention)
+            for index in indexes:
+                pipe.zadd(index, {record["job_id"]: finished_at})
+                # Expired records leave index entries behind; trim them as we go
+                pipe.zremrangebyscore(index, "-inf", cutoff)
+                pipe.expire(index, self.retention)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.get(self.record_key(job_id))
+        return _decode(raw) if raw else None
+
+    async def query(
+        self,
+        repo: Optional[str] = None,
+        pr: Optional[int] = None,
+        source: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        cursor: Optional[float] = None,
+        detail: bool = False,
+    ) -> Tuple[List[dict], Optional[float]]:
+        """
+        Reviews finished in [since, until], newest first, read from the most
+        specific index for the filters. Pass the returned cursor back to get
+        the next page (None at the end). When `source` is combined with
+        `repo`, it is applied after the index read, so a page can come back
+        short while more pages remain.
+        """
+        index = self.index_key(repo=repo, pr=pr, source=source)
+        upper = f"({cursor}" if cursor is not None else (until if until is not None else "+inf")
+        lower = since if since is not None else "-inf"
+        ids = await self.redis.zrevrangebyscore(index, upper, lower, start=0, num=limit + 1, withscores=True)
+        page, more = ids[:limit], len(ids) > limit
+        if not page:
+            return [], None
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job_id, _ in page:
+                pipe.get(self.record_key(job_id))
+            raw = await pipe.execute()
+
+        records = []
+        for item in raw:
+            if not item:
+                continue  # Expired since it was indexed
+            record = _decode(item)
+            if source and record.get("source") != source:
+                continue
+            if not detail:
+                for name in _DETAIL_FIELDS:
+                    record.pop(name, None)
+            records.append(record)
+        return records, (page[-1][1] if more else None)
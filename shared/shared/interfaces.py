@@ -1,12 +1,78 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, List
 from shared.config import Settings
 
 class RedisStrategy(ABC):
     @abstractmethod
-    def create_client(self, settings: Settings, **kwargs) -> Any:
+    def create_client(self, settings: Settings, url: str, **kwargs) -> Any:
         """
-        Creates and returns a Redis client (async).
+        Creates and returns a Redis client (async) for `url`.
         Accepts **kwargs for specific connection options (e.g., max_connections).
         """
-        pass
\ No newline at end of file
+        pass
+
+    def create_subscriber(self, settings: Settings, url: str, **kwargs) -> Any:
+        """
+        Creates a client for a long-lived pub/sub subscription.
+        """
+        return self.create_client(settings, url, **kwargs)
+
+
+@dataclass
+class QueuedJob:
+    """A job read from the queue. `id` is backend specific (stream entry id, or empty)."""
+    id: str
+    data: dict
+    shard: int = 0  # Index of the queue shard it was read from
+
+
+class JobQueueStrategy(ABC):
+    @abstractmethod
+    async def enqueue(self, job: dict) -> str:
+        """
+        Adds a job to the queue and returns its backend id.
+        """
+        pass
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[str]:
+        """
+        Adds several jobs in as few round trips as the backend allows.
+        """
+        return [await self.enqueue(job) for job in jobs]
+
+    @abstractmethod
+    async def dequeue(self, consumer: str, count: int = 1, timeout: float = 2) -> List[QueuedJob]:
+        """
+        Waits up to `timeout` seconds for jobs and returns at most `count` of them.
+        """
+        pass
+
+    @abstractmethod
+    async def ack(self, job: QueuedJob) -> None:
+        """
+        Marks a job as done so it is never delivered again.
+        """
+        pass
+
+    async def requeue(self, job: QueuedJob) -> None:
+        """
+        Hands a job this consumer will not finish back to the queue.
+        """
+        await self.enqueue(job.data)
+        await self.ack(job)
+
+    async def touch(self, consumer: str, jobs: List[QueuedJob]) -> None:
+        """
+        Tells the backend `consumer` is still working on `jobs`, so they are
+        not redelivered to another consumer. A no-op for backends that never
+        redeliver.
+        """
+        return None
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """
+        Returns the number of jobs waiting to be picked up.
+        """
+        pass
@@ -0,0 +1,472 @@
+import json
+import os
+import zlib
+import socket
+import logging
+from typing import Dict, List, Optional, Type
+from redis import asyncio as aioredis
+from redis.exceptions import NoScriptError, ResponseError
+from shared.config import Settings, settings as global_settings
+from shared.interfaces import JobQueueStrategy, QueuedJob
+from shared.providers.redis import QUEUE_CLIENT, RedisFactory
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_REGISTRY: Dict[str, Type["BaseJobQueue"]] = {}
+
+# Incremented by workers for every job that leaves the pipeline (throughput estimate)
+JOBS_DONE_KEY = "sentinel:stats:jobs_done"
+
+
+def register_queue_strategy(name: str):
+    def decorator(cls):
+        _QUEUE_REGISTRY[name] = cls
+        return cls
+
+    return decorator
+
+
+def default_consumer_name(settings: Settings = global_settings) -> str:
+    return settings.QUEUE_CONSUMER_NAME or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_names(settings: Settings = global_settings) -> List[str]:
+    """
+    Key base of each queue shard. Sharded names are hash tags, so all keys
+    of one shard live in one cluster slot and its Lua scripts stay legal.
+    """
+    if settings.QUEUE_SHARDS <= 1 and settings.REDIS_STRATEGY != "cluster":
+        return [settings.QUEUE_NAME]
+    return [f"{{{settings.QUEUE_NAME}:{i}}}" for i in range(max(1, settings.QUEUE_SHARDS))]
+
+
+class BaseJobQueue(JobQueueStrategy):
+    def __init__(self, redis: aioredis.Redis, settings: Settings, name: Optional[str] = None):
+        self.redis = redis
+        self.settings = settings
+        self.name = name or settings.QUEUE_NAME
+        self.key = self.name
+
+
+@register_queue_strategy("list")
+class ListJobQueue(BaseJobQueue):
+    """
+    Classic LPUSH/BRPOP queue. Fast and simple, but a job popped by a
+    worker that dies before finishing it is lost.
+    """
+
+    async def enqueue(self, job: dict) -> str:
+        await self.redis.lpush(self.key, json.dumps(job))  # type: ignore
+        return ""
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[str]:
+        if jobs:
+            # One LPUSH with several values keeps FIFO order for BRPOP
+            await self.redis.lpush(self.key, *(json.dumps(job) for job in jobs))  # type: ignore
+        return [""] * len(jobs)
+
+    async def dequeue(self, consumer: str, count: int = 1, timeout: float = 2) -> List[QueuedJob]:
+        if timeout <= 0:
+            # BRPOP would treat 0 as "block forever"
+            return [QueuedJob(id="", data=json.loads(item)) for item in await self.redis.rpop(self.key, count) or []]  # type: ignore
+
+        result = await self.redis.brpop([self.key], timeout=timeout)  # type: ignore
+        if not result:
+            return []
+
+        _, data = result
+        raw = [data]
+        if count > 1:
+            # Drain whatever else is already waiting, without blocking again
+            raw.extend(await self.redis.rpop(self.key, count - 1) or [])  # type: ignore
+
+        return [QueuedJob(id="", data=json.loads(item)) for item in raw]
+
+    async def ack(self, job: QueuedJob) -> None:
+        # Popping already removed the job
+        return None
+
+    async def requeue(self, job: QueuedJob) -> None:
+        # Back on the consuming end, so it is the next job served
+        await self.redis.rpush(self.key, json.dumps(job.data))  # type: ignore
+
+    async def depth(self) -> int:
+        return await self.redis.llen(self.key)  # type: ignore
+
+
+_STREAM_TOUCH_LUA = """
+-- KEYS: stream
+-- ARGV: group, consumer, entry ids...
+-- Resets the idle time of entries still pending for this consumer; entries
+-- another consumer has claimed meanwhile are left alone.
+local kept = 0
+for i = 3, #ARGV do
+    local pending = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[i], ARGV[i], 1)
+    if pending[1] and pending[1][2] == ARGV[2] then
+        redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[2], 0, ARGV[i], 'JUSTID')
+        kept = kept + 1
+    end
+end
+return kept
+"""
+
+
+@register_queue_strategy("stream")
+class StreamJobQueue(BaseJobQueue):
+    """
+    Redis Streams consumer-group queue.
+
+    Entries stay in the group's pending list until acked, so a job read by a
+    worker that crashes is auto-claimed by another consumer once it has been
+    idle for QUEUE_CLAIM_IDLE_MS. XPENDING shows outstanding work per consumer.
+    Consumers `touch()` the jobs they hold more often than that, so a long
+    review is not mistaken for an abandoned one. Reclaiming walks the
+    pending list with the XAUTOCLAIM cursor, a page per dequeue.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings, name: Optional[str] = None):
+        super().__init__(redis, settings, name)
+        # Separate key: a list and a stream cannot share a name
+        self.key = f"{self.name}:stream"
+        self.group = settings.QUEUE_STREAM_GROUP
+        self._group_ready = False
+        self._claim_cursor = "0-0"
+        self._touch_script = redis.register_script(_STREAM_TOUCH_LUA)
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def enqueue(self, job: dict) -> str:
+        return await self.redis.xadd(
+            self.key,
+            {"job": json.dumps(job)},
+            maxlen=self.settings.QUEUE_STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[str]:
+        if not jobs:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.xadd(
+                    self.key,
+                    {"job": json.dumps(job)},
+                    maxlen=self.settings.QUEUE_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            return await pipe.execute()
+
+    async def dequeue(self, consumer: str, count: int = 1, timeout: float = 2) -> List[QueuedJob]:
+        await self._ensure_group()
+
+        # Take over entries abandoned by dead consumers first
+        claimed = await self.redis.xautoclaim(
+            self.key,
+            self.group,
+            consumer,
+            min_idle_time=self.settings.QUEUE_CLAIM_IDLE_MS,
+            start_id=self._claim_cursor,
+            count=count,
+        )
+        # Resume after this page next time; "0-0" once the whole pending list was scanned
+        self._claim_cursor = claimed[0] if claimed else "0-0"
+        entries = claimed[1] if claimed else []
+        if entries:
+            logger.info(f"Reclaimed {len(entries)} idle job(s) from '{self.key}'")
+        else:
+            response = await self.redis.xreadgroup(
+                self.group,
+                consumer,
+                {self.key: ">"},
+                count=count,
+                block=int(timeout * 1000) if timeout > 0 else None,
+            )
+            entries = response[0][1] if response else []
+
+        jobs = []
+        for entry_id, fields in entries:
+            # Entries trimmed by MAXLEN come back with empty fields
+            if not fields or "job" not in fields:
+                await self.ack(QueuedJob(id=entry_id, data={}))
+                continue
+            jobs.append(QueuedJob(id=entry_id, data=json.loads(fields["job"])))
+        return jobs
+
+    async def ack(self, job: QueuedJob) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.key, self.group, job.id)
+            pipe.xdel(self.key, job.id)
+            await pipe.execute()
+
+    async def touch(self, consumer: str, jobs: List[QueuedJob]) -> None:
+        ids = [job.id for job in jobs if job.id]
+        if ids:
+            await self._touch_script(keys=[self.key], args=[self.group, consumer, *ids])
+
+    async def depth(self) -> int:
+        await self._ensure_group()
+        # Acked entries are deleted, so the stream holds waiting + pending jobs
+        length = await self.redis.xlen(self.key)
+        pending = await self.redis.xpending(self.key, self.group)
+        return max(0, length - (pending.get("pending") or 0))
+
+    async def pending_by_consumer(self) -> Dict[str, int]:
+        """Returns the number of unacked jobs held by each consumer."""
+        await self._ensure_group()
+        pending = await self.redis.xpending(self.key, self.group)
+        return {c["name"]: int(c["pending"]) for c in pending.get("consumers") or []}
+
+
+_FAIR_ENQUEUE_LUA = """
+-- KEYS: ready zset, virtual time, priority list, weights hash, signal list, depth counter, tenant list
+-- ARGV: tenant ('' = priority lane), job, weight
+if ARGV[1] == '' then
+    redis.call('LPUSH', KEYS[3], ARGV[2])
+else
+    redis.call('LPUSH', KEYS[7], ARGV[2])
+    redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+        -- A newly active tenant starts at the current virtual time (no banked credit)
+        redis.call('ZADD', KEYS[1], tonumber(redis.call('GET', KEYS[2]) or '0'), ARGV[1])
+    end
+end
+redis.call('INCR', KEYS[6])
+redis.call('LPUSH', KEYS[5], 1)
+redis.call('LTRIM', KEYS[5], 0, 999)
+return 1
+"""
+
+_FAIR_DEQUEUE_LUA = """
+-- KEYS: ready zset, virtual time, priority list, weights hash, signal list, depth counter
+-- ARGV: max jobs, tenant list prefix
+-- Tenant lists are only known once popped from the ready zset; their keys
+-- carry the same hash tag as KEYS, so they live in the same cluster slot
+local out = {}
+local count = tonumber(ARGV[1])
+while #out < count do
+    local job = redis.call('RPOP', KEYS[3])
+    if not job then break end
+    table.insert(out, job)
+end
+while #out < count do
+    local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if #head == 0 then break end
+    local tenant, start = head[1], tonumber(head[2])
+    local list = ARGV[2] .. tenant
+    local job = redis.call('RPOP', list)
+    if job then table.insert(out, job) end
+    redis.call('SET', KEYS[2], start)
+    if job and redis.call('LLEN', list) > 0 then
+        local weight = tonumber(redis.call('HGET', KEYS[4], tenant) or '1')
+        redis.call('ZADD', KEYS[1], start + 1 / weight, tenant)
+    else
+        redis.call('ZREM', KEYS[1], tenant)
+    end
+end
+if #out > 0 then redis.call('DECRBY', KEYS[6], #out) end
+return out
+"""
+
+
+@register_queue_strategy("fair")
+class FairJobQueue(BaseJobQueue):
+    """
+    Weighted fair queue across tenants (repos or installations).
+
+    Every tenant has its own sub-queue; a sorted set orders active tenants
+    by virtual time, and serving a tenant advances it by 1/weight, so a
+    repo with 300 queued PRs gets its share instead of the whole queue.
+    Manual reviews use a priority lane served first. Enqueue and dequeue
+    are single Lua calls (O(log tenants)), so any number of gateways and
+    workers can share it. Like the list backend, popped jobs are not
+    redelivered if a worker dies.
+
+    The dequeue script finds tenant sub-queues at run time, so every key
+    is hash-tagged (even unsharded), keeping them in one cluster slot.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings, name: Optional[str] = None):
+        super().__init__(redis, settings, name)
+        tagged = self.name if "{" in self.name and "}" in self.name else f"{{{self.name}}}"
+        base = f"{tagged}:fair"
+        self.tenant_prefix = f"{base}:t:"
+        self.keys = [
+            f"{base}:ready",
+            f"{base}:vtime",
+            f"{base}:priority",
+            f"{base}:weights",
+            f"{base}:signal",
+            f"{base}:depth",
+        ]
+        self._enqueue_script = redis.register_script(_FAIR_ENQUEUE_LUA)
+        self._dequeue_script = redis.register_script(_FAIR_DEQUEUE_LUA)
+
+    def tenant_for(self, job: dict) -> str:
+        """Sub-queue of a job; '' is the priority lane."""
+        if job.get("source") == "manual" and self.settings.QUEUE_FAIR_MANUAL_PRIORITY:
+            return ""
+        if self.settings.QUEUE_FAIR_TENANT_BY == "installation" and job.get("installation_id"):
+            return f"installation:{job['installation_id']}"
+        return job.get("repo_name") or "unknown"
+
+    def _enqueue_call(self, job: dict) -> dict:
+        tenant = self.tenant_for(job)
+        weight = self.settings.QUEUE_FAIR_WEIGHTS.get(tenant, 1.0)
+        # The priority lane has no tenant list; KEYS[7] is unused then
+        tenant_key = self.tenant_prefix + tenant if tenant else self.keys[2]
+        return {"keys": [*self.keys, tenant_key], "args": [tenant, json.dumps(job), weight]}
+
+    async def enqueue(self, job: dict) -> str:
+        await self._enqueue_script(**self._enqueue_call(job))
+        return ""
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[str]:
+        if jobs:
+            try:
+                await self._enqueue_pipelined(jobs)
+            except NoScriptError:
+                # Cluster pipelines do not preload scripts, and a new, restarted or failed-over
+                # node has none cached. Every key is in one slot, so the whole batch hit the
+                # same node and failed together: load the script and send it again.
+                await self.redis.script_load(_FAIR_ENQUEUE_LUA)
+                await self._enqueue_pipelined(jobs)
+        return [""] * len(jobs)
+
+    async def _enqueue_pipelined(self, jobs: List[dict]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                await self._enqueue_script(**self._enqueue_call(job), client=pipe)
+            await pipe.execute()
+
+    async def _pop(self, count: int) -> List[QueuedJob]:
+        raw = await self._dequeue_script(keys=self.keys, args=[count, self.tenant_prefix])
+        return [QueuedJob(id="", data=json.loads(item)) for item in raw or []]
+
+    async def dequeue(self, consumer: str, count: int = 1, timeout: float = 2) -> List[QueuedJob]:
+        jobs = await self._pop(count)
+        if jobs or timeout <= 0:
+            return jobs
+        # Sleep until an enqueue signals new work (or the timeout passes)
+        await self.redis.brpop([self.keys[4]], timeout=timeout)  # type: ignore
+        return await self._pop(count)
+
+    async def ack(self, job: QueuedJob) -> None:
+        # Popping already removed the job
+        return None
+
+    async def depth(self) -> int:
+        return max(0, int(await self.redis.get(self.keys[5]) or 0))
+
+
+class ShardedJobQueue(JobQueueStrategy):
+    """
+    Spreads jobs over QUEUE_SHARDS queues of the configured backend, so on
+    Redis Cluster the load lands on several nodes instead of one slot.
+
+    A job's shard is a hash of its PR (or id), so pushes for one PR keep
+    their order. Workers sweep the shards without blocking, starting from a
+    rotating offset, and only block on one shard when all are empty.
+    Fairness (the "fair" backend) holds within each shard.
+    """
+
+    def __init__(self, shards: List[JobQueueStrategy]):
+        self.shards = shards
+        self._next = 0
+
+    def shard_for(self, job: dict) -> int:
+        repo, pr = job.get("repo_name"), job.get("pr_number")
+        routing = f"{repo}#{pr}" if repo and pr is not None else str(job.get("id") or json.dumps(job, sort_keys=True))
+        return zlib.crc32(routing.encode()) % len(self.shards)
+
+    async def enqueue(self, job: dict) -> str:
+        return await self.shards[self.shard_for(job)].enqueue(job)
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[str]:
+        groups: Dict[int, List[int]] = {}
+        for position, job in enumerate(jobs):
+            groups.setdefault(self.shard_for(job), []).append(position)
+
+        ids = [""] * len(jobs)
+        for shard, positions in groups.items():
+            shard_ids = await self.shards[shard].enqueue_many([jobs[p] for p in positions])
+            for position, job_id in zip(positions, shard_ids):
+                ids[position] = job_id
+        return ids
+
+    async def dequeue(self, consumer: str, count: int = 1, timeout: float = 2) -> List[QueuedJob]:
+        start = self._next
+        self._next = (self._next + 1) % len(self.shards)
+        order = [(start + i) % len(self.shards) for i in range(len(self.shards))]
+
+        jobs: List[QueuedJob] = []
+        for index in order:
+            jobs.extend(self._tag(index, await self.shards[index].dequeue(consumer, count - len(jobs), timeout=0)))
+            if len(jobs) >= count:
+                return jobs
+        if jobs or timeout <= 0:
+            return jobs
+        return self._tag(start, await self.shards[start].dequeue(consumer, count, timeout))
+
+    @staticmethod
+    def _tag(index: int, jobs: List[QueuedJob]) -> List[QueuedJob]:
+        for job in jobs:
+            job.shard = index
+        return jobs
+
+    async def ack(self, job: QueuedJob) -> None:
+        await self.shards[job.shard].ack(job)
+
+    async def requeue(self, job: QueuedJob) -> None:
+        await self.shards[job.shard].requeue(job)
+
+    async def touch(self, consumer: str, jobs: List[QueuedJob]) -> None:
+        by_shard: Dict[int, List[QueuedJob]] = {}
+        for job in jobs:
+            by_shard.setdefault(job.shard, []).append(job)
+        for index, shard_jobs in by_shard.items():
+            await self.shards[index].touch(consumer, shard_jobs)
+
+    async def depth(self) -> int:
+        return sum([await shard.depth() for shard in self.shards])
+
+
+class QueueFactory:
+    """
+    Manages the process-wide job queue (Singleton), selected by QUEUE_BACKEND
+    and sharded when QUEUE_SHARDS > 1 (or on Redis Cluster).
+    """
+
+    _instance: Optional[JobQueueStrategy] = None
+
+    @classmethod
+    def get_queue(
+        cls, settings: Settings = global_settings, redis: Optional[aioredis.Redis] = None
+    ) -> JobQueueStrategy:
+        if cls._instance is not None:
+            return cls._instance
+
+        backend = settings.QUEUE_BACKEND.lower()
+        strategy_cls = _QUEUE_REGISTRY.get(backend)
+        if not strategy_cls:
+            raise ValueError(f"Unknown Queue Backend: {backend}. Available: {list(_QUEUE_REGISTRY.keys())}")
+
+        redis = redis or RedisFactory.get_client(settings, name=QUEUE_CLIENT)
+        names = shard_names(settings)
+        if len(names) == 1:
+            cls._instance = strategy_cls(redis, settings, names[0])
+        else:
+            cls._instance = ShardedJobQueue([strategy_cls(redis, settings, name) for name in names])
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Resets the queue instance (for testing purposes)."""
+        cls._instance = None
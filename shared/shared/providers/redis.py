@@ -1,10 +1,20 @@
-from typing import Optional, Dict, Type
+import logging
+from typing import Any, Dict, Optional, Type
+from urllib.parse import urlparse
 from redis import asyncio as aioredis
 from shared.config import Settings, settings as global_settings
 from shared.interfaces import RedisStrategy
 
+logger = logging.getLogger(__name__)
+
 _REDIS_REGISTRY: Dict[str, Type[RedisStrategy]] = {}
 
+# Named clients, each with its own connection pool (sized by REDIS_POOL_SIZES)
+DEFAULT_CLIENT = "default"
+QUEUE_CLIENT = "queue"
+PUBSUB_CLIENT = "pubsub"
+CACHE_CLIENT = "cache"
+
 
 def register_redis_strategy(name: str):
     def decorator(cls):
@@ -14,71 +24,153 @@ def register_redis_strategy(name: str):
     return decorator
 
 
+def _client_defaults(**kwargs) -> Dict[str, Any]:
+    defaults = {
+        "decode_responses": True,
+        "encoding": "utf-8",
+        "socket_timeout": 5,
+    }
+    return {**defaults, **kwargs}
+
+
 @register_redis_strategy("standard")
 class StandardRedisStrategy(RedisStrategy):
-    def create_client(self, settings: Settings, **kwargs) -> aioredis.Redis:
-        default_kwargs = {
-            "decode_responses": True,
-            "encoding": "utf-8",
-            "max_connections": 10,
-            "socket_timeout": 5,
-        }
-        connection_args = {**default_kwargs, **kwargs}
-        return aioredis.from_url(settings.REDIS_URL, **connection_args)
+    def create_client(self, settings: Settings, url: str, **kwargs) -> aioredis.Redis:
+        return aioredis.from_url(url, **_client_defaults(**kwargs))
+
+
+@register_redis_strategy("cluster")
+class ClusterRedisStrategy(RedisStrategy):
+    """
+    Redis Cluster. REDIS_URL points at any node; the client discovers the
+    rest and routes each key to the node owning its slot.
+    """
+
+    def create_client(self, settings: Settings, url: str, **kwargs):
+        from redis.asyncio.cluster import RedisCluster
+
+        return RedisCluster.from_url(url, **_client_defaults(**kwargs))
+
+    def create_subscriber(self, settings: Settings, url: str, **kwargs) -> aioredis.Redis:
+        # Classic PUBLISH is broadcast over the cluster bus, so any single node can serve SUBSCRIBE
+        return aioredis.from_url(url, **_client_defaults(**kwargs))
+
+
+@register_redis_strategy("sentinel")
+class SentinelRedisStrategy(RedisStrategy):
+    """
+    Primary discovered through Redis Sentinel (REDIS_SENTINELS,
+    REDIS_SENTINEL_MASTER); the client follows failovers. Password and db
+    are taken from REDIS_URL.
+    """
+
+    def create_client(self, settings: Settings, url: str, **kwargs) -> aioredis.Redis:
+        from redis.asyncio.sentinel import Sentinel
+
+        if not settings.REDIS_SENTINELS:
+            raise ValueError("REDIS_SENTINELS must list at least one host:port for the sentinel strategy")
+
+        parsed = urlparse(url)
+        sentinels = []
+        for address in settings.REDIS_SENTINELS:
+            host, _, port = address.rpartition(":")
+            sentinels.append((host, int(port)))
+
+        options = _client_defaults(**kwargs)
+        if parsed.password:
+            options.setdefault("password", parsed.password)
+        if parsed.path.strip("/").isdigit():
+            options.setdefault("db", int(parsed.path.strip("/")))
+
+        sentinel = Sentinel(sentinels, socket_timeout=options.get("socket_timeout"))
+        return sentinel.master_for(settings.REDIS_SENTINEL_MASTER, redis_class=aioredis.Redis, **options)
 
 
 @register_redis_strategy("mock")
 class MockRedisStrategy(RedisStrategy):
     """
-    Requires 'fakeredis' to be installed.
+    Requires 'fakeredis' to be installed. Every client shares one in-memory
+    server, like named clients of a real deployment share one Redis.
     """
 
-    def create_client(self, settings: Settings, **kwargs):
-        try:
-            from fakeredis import aioredis as fake_aioredis
+    _server = None
 
-            return fake_aioredis.FakeRedis(decode_responses=True)
+    def create_client(self, settings: Settings, url: str, **kwargs):
+        try:
+            from fakeredis import FakeServer, aioredis as fake_aioredis
         except ImportError:
             raise ImportError("Install 'fakeredis' to use MockRedisStrategy")
 
+        if MockRedisStrategy._server is None:
+            MockRedisStrategy._server = FakeServer()
+        return fake_aioredis.FakeRedis(server=MockRedisStrategy._server, decode_responses=True)
+
 
 class RedisFactory:
     """
-    Manages the lifecycle of the Redis client (Singleton)
-    and delegates creation to the registered strategy.
+    Manages the process's Redis clients: one per name (e.g. "queue",
+    "pubsub", "cache"), so hot paths don't compete for one pool. Each is a
+    singleton created on first use by the strategy in REDIS_STRATEGY, with
+    a pool sized by REDIS_POOL_SIZES[name] and optionally its own server
+    (REDIS_CLIENT_URLS[name]).
     """
 
-    _instance: Optional[aioredis.Redis] = None
+    _instances: Dict[str, aioredis.Redis] = {}
+    _options: Dict[str, tuple] = {}
+
+    @classmethod
+    def _strategy(cls, strategy_type: str) -> RedisStrategy:
+        strategy_cls = _REDIS_REGISTRY.get(strategy_type)
+        if not strategy_cls:
+            raise ValueError(f"Unknown Redis Strategy: {strategy_type}. Available: {list(_REDIS_REGISTRY.keys())}")
+        return strategy_cls()
 
     @classmethod
     def get_client(
-        cls, settings: Settings = global_settings, strategy_type: str = "standard", **kwargs
+        cls,
+        settings: Settings = global_settings,
+        strategy_type: Optional[str] = None,
+        name: str = DEFAULT_CLIENT,
+        **kwargs,
     ) -> aioredis.Redis:
         """
-        Returns a Singleton Redis client.
-        If it exists, it returns the existing one (reusing the pool).
-        If not, it creates a new one using the specified strategy.
+        Returns the named client, creating it (and its pool) on first use.
+        Options passed once the client exists cannot apply to it, so a
+        mismatch is logged rather than silently dropped.
         """
-        if cls._instance is not None:
-            return cls._instance
-
-        # Look up strategy in registry
-        strategy_cls = _REDIS_REGISTRY.get(strategy_type)
-        if not strategy_cls:
-            raise ValueError(f"Unknown Redis Strategy: {strategy_type}")
+        options = (strategy_type, tuple(sorted(kwargs.items())))
+        instance = cls._instances.get(name)
+        if instance is not None:
+            if (strategy_type or kwargs) and options != cls._options.get(name):
+                logger.warning(f"Redis client '{name}' already exists; ignoring new options {options}")
+            return instance
+
+        strategy = cls._strategy(strategy_type or settings.REDIS_STRATEGY)
+        kwargs.setdefault("max_connections", settings.REDIS_POOL_SIZES.get(name, settings.REDIS_MAX_CONNECTIONS))
+        instance = strategy.create_client(settings, settings.REDIS_CLIENT_URLS.get(name, settings.REDIS_URL), **kwargs)
+        cls._instances[name] = instance
+        cls._options[name] = options
+        return instance  # type: ignore
 
-        strategy = strategy_cls()
-        cls._instance = strategy.create_client(settings, **kwargs)
-        return cls._instance  # type: ignore
+    @classmethod
+    def create_subscriber(cls, settings: Settings = global_settings, **kwargs) -> aioredis.Redis:
+        """
+        Returns a new, unshared client for a long-lived subscription.
+        The caller owns it and must close it.
+        """
+        strategy = cls._strategy(settings.REDIS_STRATEGY)
+        url = settings.REDIS_CLIENT_URLS.get(PUBSUB_CLIENT, settings.REDIS_URL)
+        return strategy.create_subscriber(settings, url, **kwargs)
 
     @classmethod
     def reset(cls):
-        """Resets the Redis client instance (for testing purposes)."""
-        cls._instance = None
+        """Forgets every client (for testing purposes)."""
+        cls._instances = {}
+        cls._options = {}
 
     @classmethod
     async def close(cls):
-        """Closes the Redis client connection (if exists)."""
-        if cls._instance is not None:
-            await cls._instance.close()
-            cls._instance = None
+        """Closes every client connection."""
+        instances, cls._instances, cls._options = cls._instances, {}, {}
+        for instance in instances.values():
+            await instance.aclose()
@@ -0,0 +1,194 @@
+"""
+Delayed retries and the dead-letter queue for failed review jobs.
+
+A failed job is written to a sorted set scored by the time of its next
+attempt; a promoter task (run by every worker, safely concurrent) moves
+due jobs back onto the live queue. Jobs that run out of attempts land in
+the dead-letter queue, where the gateway can list, requeue or delete them.
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from redis import asyncio as aioredis
+from shared.config import Settings
+from shared.interfaces import JobQueueStrategy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1-based): exponential, with the upper half jittered."""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryQueue:
+    """
+    Retry schedule (`{QUEUE_NAME}:retry`) and dead-letter queue
+    (`{QUEUE_NAME}:dead`, indexed by failure time in `:dead:index`).
+
+    The policy for an error is the RETRY_POLICIES entry of the first class
+    in its MRO that has one, on top of the RETRY_* defaults.
+    """
+
+    def __init__(self, redis: aioredis.Redis, settings: Settings):
+        self.redis = redis
+        self.settings = settings
+        self.schedule_key = f"{settings.QUEUE_NAME}:retry"
+        self.dead_key = f"{settings.QUEUE_NAME}:dead"
+        self.dead_index_key = f"{settings.QUEUE_NAME}:dead:index"
+
+    def policy_for(self, error: BaseException) -> RetryPolicy:
+        overrides = {}
+        for cls in type(error).__mro__:
+            if cls.__name__ in self.settings.RETRY_POLICIES:
+                overrides = self.settings.RETRY_POLICIES[cls.__name__]
+                break
+        return RetryPolicy(
+            max_attempts=int(overrides.get("max_attempts", self.settings.RETRY_MAX_ATTEMPTS)),
+            base_delay=float(overrides.get("base_delay", self.settings.RETRY_BACKOFF_BASE)),
+            max_delay=float(overrides.get("max_delay", self.settings.RETRY_BACKOFF_MAX)),
+        )
+
+    async def fail(self, job: dict, error: BaseException) -> Optional[float]:
+        """
+        Records a failed attempt of `job` (which must carry its `job_id`).
+        Returns the delay until it is retried, or None if it was dead-lettered.
+        """
+        attempt = int(job.get("attempt", 0)) + 1
+        policy = self.policy_for(error)
+        job = {**job, "attempt": attempt, "last_error": f"{type(error).__name__}: {error}"}
+
+        if attempt > policy.max_attempts:
+            await self.dead_letter(job, error)
+            return None
+
+        delay = policy.backoff(attempt)
+        await self.redis.zadd(self.schedule_key, {json.dumps(job): time.time() + delay})
+        return delay
+
+    async def dead_letter(self, job: dict, error: BaseException):
+        now = time.time()
+        entry = {
+            "job_id": job["job_id"],
+            "job": job,
+            "error": f"{type(error).__name__}: {error}",
+            "attempts": int(job.get("attempt", 0)),
+            "failed_at": now,
+        }
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(self.dead_key, job["job_id"], json.dumps(entry))
+            pipe.zadd(self.dead_index_key, {job["job_id"]: now})
+            pipe.zcard(self.dead_index_key)
+            *_, size = await pipe.execute()
+
+        excess = size - self.settings.DEAD_LETTER_MAXLEN
+        if excess > 0:
+            oldest = [job_id for job_id, _ in await self.redis.zpopmin(self.dead_index_key, excess)]
+            if oldest:
+                await self.redis.hdel(self.dead_key, *oldest)  # type: ignore
+        logger.warning(f"Dead-lettered job {job['job_id']} after {entry['attempts']} attempt(s): {entry['error']}")
+
+    async def promote(self, queue: JobQueueStrategy, limit: int) -> int:
+        """Moves up to `limit` due jobs back onto `queue`; returns how many moved."""
+        due = await self.redis.zrangebyscore(self.schedule_key, "-inf", time.time(), start=0, num=limit)
+        if not due:
+            return 0
+
+        # ZREM decides which promoter owns each job when several workers race
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member in due:
+                pipe.zrem(self.schedule_key, member)
+            claimed = await pipe.execute()
+        owned = [member for member, removed in zip(due, claimed) if removed]
+        if not owned:
+            return 0
+
+        try:
+            await queue.enqueue_many([json.loads(member) for member in owned])
+        except Exception:
+            # Put them back so the next pass tries again
+            await self.redis.zadd(self.schedule_key, {member: time.time() for member in owned})
+            raise
+        return len(owned)
+
+    async def run_promoter(self, queue: JobQueueStrategy):
+        """Promotes due retries until cancelled."""
+        batch = max(1, self.settings.RETRY_PROMOTE_BATCH)
+        while True:
+            try:
+                moved = await self.promote(queue, batch)
+                if moved:
+                    logger.info(f"Requeued {moved} job(s) due for retry")
+                if moved >= batch:
+                    continue  # More may be due right away
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Retry promotion failed: {e}")
+            await asyncio.sleep(self.settings.RETRY_PROMOTE_INTERVAL)
+
+    async def counts(self) -> Tuple[int, int]:
+        """Returns (jobs waiting for a retry, dead-lettered jobs)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(self.schedule_key)
+            pipe.zcard(self.dead_index_key)
+            scheduled, dead = await pipe.execute()
+        return int(scheduled), int(dead)
+
+    async def list_dead(self, limit: int = 50, before: Optional[float] = None) -> Tuple[List[dict], Optional[float]]:
+        """
+        Dead-lettered jobs, newest first, failed strictly before `before`.
+        Returns the page and the cursor for the next one (None at the end).
+        """
+        upper = f"({before}" if before is not None else "+inf"
+        ids = await self.redis.zrevrangebyscore(
+            self.dead_index_key, upper, "-inf", start=0, num=limit + 1, withscores=True
+        )
+        page, more = ids[:limit], len(ids) > limit
+        if not page:
+            return [], None
+
+        raw = await self.redis.hmget(self.dead_key, [job_id for job_id, _ in page])  # type: ignore
+        entries = [json.loads(item) for item in raw if item]
+        return entries, (page[-1][1] if more else None)
+
+    async def get_dead(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.hget(self.dead_key, job_id)  # type: ignore
+        return json.loads(raw) if raw else None
+
+    async def delete_dead(self, job_id: str) -> bool:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hdel(self.dead_key, job_id)
+            pipe.zrem(self.dead_index_key, job_id)
+            removed, _ = await pipe.execute()
+        return bool(removed)
+
+    async def requeue_dead(self, job_id: str, queue: JobQueueStrategy) -> bool:
+        """Puts a dead-lettered job back on `queue` with a fresh attempt count."""
+        entry = await self.get_dead(job_id)
+        # Deleting first means concurrent requeues of one job enqueue it once
+        if entry is None or not await self.delete_dead(job_id):
+            return False
+
+        job = {key: value for key, value in entry["job"].items() if key not in ("attempt", "last_error")}
+        try:
+            await queue.enqueue(job)
+        except Exception:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(self.dead_key, job_id, json.dumps(entry))
+                pipe.zadd(self.dead_index_key, {job_id: entry["failed_at"]})
+                await pipe.execute()
+            raise
+        logger.info(f"Requeued dead-lettered job {job_id}")
+        return True